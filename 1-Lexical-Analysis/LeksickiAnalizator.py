@@ -1,11 +1,24 @@
+import argparse
+import bisect
+import json
+import re
 import sys
+import time
+from array import array
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    resource = None
 
 
 class Token:
-    def __init__(self, identifier, line_number, value):
+    def __init__(self, identifier, line_number, value, symbol=None):
         self.identifier = identifier
         self.line_number = line_number
         self.value = value
+        self.symbol = symbol
 
     def __repr__(self):
         return "{} {} {}".format(self.identifier,
@@ -16,6 +29,281 @@ class Token:
                                  self.line_number, self.value)
 
 
+class Stats:
+    """
+    Opt-in instrumentation shared by the 'PJ' analyzers.
+
+    Analyzers take an optional Stats object and only touch it when
+    one is given. Collected are wall times of named phases, counters,
+    maxima and the peak resident memory of the process, reported
+    as JSON.
+    """
+
+    def __init__(self):
+        self.timings = dict()
+        self.counters = dict()
+
+    @contextmanager
+    def phase(self, name):
+        """ Measure wall time of the with block """
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + \
+                time.perf_counter() - start
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def maximum(self, name, value):
+        if value > self.counters.get(name, 0):
+            self.counters[name] = value
+
+    def peak_memory(self):
+        """ Peak resident memory of the process in KiB """
+        if resource is None:
+            return None
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak // 1024 if sys.platform == "darwin" else peak
+
+    def report(self):
+        return {
+            "timings": self.timings,
+            "counters": self.counters,
+            "peak_memory_kib": self.peak_memory()
+        }
+
+    def dump(self, stream=None):
+        """ Write the report to stream, sys.stderr at the time of the call by default """
+        stream = stream if stream is not None else sys.stderr
+        json.dump(self.report(), stream, indent=2, sort_keys=True)
+        stream.write("\n")
+
+
+class SymbolTable:
+    """
+    Interned identifier names.
+
+    Every distinct IDN gets a small integer id the first time it is
+    seen, later phases compare and look up ids and need the name
+    only for printing.
+    """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+
+    def __len__(self):
+        return len(self.names)
+
+    def intern(self, name):
+        symbol = self.ids.get(name)
+        if symbol is None:
+            symbol = len(self.names)
+            self.ids[name] = symbol
+            self.names.append(name)
+        return symbol
+
+    def name(self, symbol):
+        return self.names[symbol]
+
+
+class TokenRecord:
+    """
+    Token stored in <class TokenBuffer>.
+
+    Behaves like <class Token>, but holds only the buffer and the index,
+    value is cut out of the source when asked for.
+    """
+
+    __slots__ = ("buffer", "index")
+
+    def __init__(self, buffer, index):
+        self.buffer = buffer
+        self.index = index
+
+    @property
+    def identifier(self):
+        return DataTypes.KINDS[self.buffer.kinds[self.index]]
+
+    @property
+    def line_number(self):
+        return self.buffer.line(self.index)
+
+    @property
+    def value(self):
+        return self.buffer.value(self.index)
+
+    @property
+    def symbol(self):
+        symbol = self.buffer.symbols[self.index]
+        return symbol if symbol >= 0 else None
+
+    def __repr__(self):
+        return "{} {} {}".format(self.identifier,
+                                 self.line_number, self.value)
+
+    def __str__(self):
+        return "{} {} {}".format(self.identifier,
+                                 self.line_number, self.value)
+
+
+class TokenBuffer:
+    """
+    Compact token container.
+
+    Tokens are kept as struct of arrays - kind code, line number,
+    start/end offset of the value in the source and symbol id of
+    identifiers (-1 for other tokens), 17 bytes per token.
+    No per-token objects or value strings are kept around.
+    Indexing and iteration give <class TokenRecord> views.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.kinds = array("B")
+        self.lines = array("I")
+        self.starts = array("I")
+        self.ends = array("I")
+        self.symbols = array("i")
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.kinds)
+        if not 0 <= index < len(self.kinds):
+            raise IndexError("token index out of range")
+        return TokenRecord(self, index)
+
+    def __iter__(self):
+        for index in range(len(self.kinds)):
+            yield TokenRecord(self, index)
+
+    def append(self, kind_code, line_number, start, end, symbol=-1):
+        self.kinds.append(kind_code)
+        self.lines.append(line_number)
+        self.starts.append(start)
+        self.ends.append(end)
+        self.symbols.append(symbol)
+
+    def line(self, index):
+        return self.lines[index]
+
+    def value(self, index):
+        return self.source[self.starts[index]:self.ends[index]]
+
+
+class EditableTokenBuffer(TokenBuffer):
+    """
+    Token buffer that can take edits without shifting every token.
+
+    Line numbers and offsets are kept in runs, pieces of the buffer that
+    were lexed together: the stored line and offsets of a token plus the
+    deltas of its run give its place in the current source. An edit puts
+    the re-lexed tokens in a new run and adds the change in lines and
+    length to the deltas of the runs after it, so tokens after an edit
+    don't change and its cost grows with the number of runs, not with the
+    distance from the previous edit. When there are more than MAX_RUNS
+    runs, the deltas are added to the tokens and one run is left.
+    """
+
+    MAX_RUNS = 256
+
+    def __init__(self, source):
+        super().__init__(source)
+        self.last_line = 1 if len(source) >= 1 else 0
+        self.last_line += source.count(DataTypes.LINE_BREAKERS[0])
+        # first token, line delta and offset delta of every run
+        self.runs = [0]
+        self.line_deltas = [0]
+        self.offset_deltas = [0]
+
+    def run(self, index):
+        """ Run holding the token at index """
+        return bisect.bisect_right(self.runs, index) - 1
+
+    def line(self, index):
+        return self.lines[index] + self.line_deltas[self.run(index)]
+
+    def start(self, index):
+        return self.starts[index] + self.offset_deltas[self.run(index)]
+
+    def end(self, index):
+        return self.ends[index] + self.offset_deltas[self.run(index)]
+
+    def value(self, index):
+        return self.source[self.start(index):self.end(index)]
+
+    def find(self, offset):
+        """ Index of the first token starting at or after offset """
+        low, high = 0, len(self.kinds)
+        while low < high:
+            middle = (low + high) // 2
+            if self.start(middle) < offset:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def split_run(self, index):
+        """ Start a run at index, with the deltas of the run holding it """
+        if 0 < index < len(self.kinds):
+            run = self.run(index)
+            if self.runs[run] != index:
+                self.runs.insert(run + 1, index)
+                self.line_deltas.insert(run + 1, self.line_deltas[run])
+                self.offset_deltas.insert(run + 1, self.offset_deltas[run])
+
+    def fold(self):
+        """ Add the deltas of every run to its tokens, leaving one run """
+        ends = self.runs[1:] + [len(self.kinds)]
+        for first, last, line_delta, offset_delta in \
+                zip(self.runs, ends, self.line_deltas, self.offset_deltas):
+            for numbers, delta in ((self.lines, line_delta), (self.starts, offset_delta),
+                                   (self.ends, offset_delta)):
+                if delta != 0:
+                    numbers[first:last] = array("I", map(delta.__add__, numbers[first:last]))
+        self.runs = [0]
+        self.line_deltas = [0]
+        self.offset_deltas = [0]
+
+    def replace(self, first, last, tokens, source, line_delta):
+        """
+        Put tokens (absolute, of the new source) in place of
+        tokens[first:last] and switch to the new source.
+        """
+        self.split_run(first)
+        self.split_run(last)
+        low = bisect.bisect_left(self.runs, first)
+        high = bisect.bisect_left(self.runs, last) if last < len(self.kinds) else len(self.runs)
+        inserted = [first] if len(tokens) > 0 else []
+        self.runs[low:high] = inserted
+        self.line_deltas[low:high] = [0] * len(inserted)
+        self.offset_deltas[low:high] = [0] * len(inserted)
+
+        shift = len(tokens) - (last - first)
+        offset_delta = len(source) - len(self.source)
+        for run in range(low + len(inserted), len(self.runs)):
+            self.runs[run] += shift
+            self.line_deltas[run] += line_delta
+            self.offset_deltas[run] += offset_delta
+        if len(self.runs) == 0:
+            self.runs, self.line_deltas, self.offset_deltas = [0], [0], [0]
+
+        self.kinds[first:last] = tokens.kinds
+        self.lines[first:last] = tokens.lines
+        self.starts[first:last] = tokens.starts
+        self.ends[first:last] = tokens.ends
+        self.symbols[first:last] = tokens.symbols
+        self.source = source
+        self.last_line += line_delta
+        if len(self.runs) > self.MAX_RUNS:
+            self.fold()
+
+
 class DataTypes:
     OPERATORS = {
         "=": "OP_PRIDRUZI",
@@ -42,11 +330,52 @@ class DataTypes:
     VARIABLE = "IDN"
     FULL_BREAKERS_LIST = TOKEN_BREAKERS + \
         list(OPERATORS.keys()) + list(PARENTHESIS.keys())
+    FIXED_TOKENS = dict(OPERATORS, **PARENTHESIS, **KEY_WORDS)
+    KINDS = [VARIABLE, NUMBER] + list(OPERATORS.values()) + \
+        list(PARENTHESIS.values()) + list(KEY_WORDS.values())
+    KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+class CharClass(dict):
+    """
+    Character classes of the table-driven lexer.
+
+    Used as a str.translate table: every character of the source
+    is mapped to the chr() of its class code, unknown characters
+    fall into OTHER (they are glued into identifiers).
+    """
+
+    DIGIT = 0
+    OTHER = 1
+    SINGLE = 2
+    SLASH = 3
+    BLANK = 4
+    NEWLINE = 5
+    COUNT = 6
+
+    def __missing__(self, key):
+        return chr(CharClass.OTHER)
+
+    @staticmethod
+    def build():
+        table = CharClass()
+        for c in DataTypes.DIGITS:
+            table[ord(c)] = chr(CharClass.DIGIT)
+        for c in list(DataTypes.OPERATORS.keys()) + list(DataTypes.PARENTHESIS.keys()):
+            table[ord(c)] = chr(CharClass.SINGLE)
+        for c in DataTypes.TOKEN_BREAKERS:
+            table[ord(c)] = chr(CharClass.BLANK)
+        for c in DataTypes.LINE_BREAKERS:
+            table[ord(c)] = chr(CharClass.NEWLINE)
+        table[ord(DataTypes.COMMENT[:1])] = chr(CharClass.SLASH)
+        return table
 
 
 class Lexer:
-    def __init__(self, source, debug_flag=True):
+    def __init__(self, source, debug_flag=True, symbols=None, stats=None):
         self.source_code = source
+        self.stats = stats
+        self.symbols = symbols if symbols is not None else SymbolTable()
         self.line_number = 0
         self.pointer_position = 0
         self.pointer = None
@@ -54,10 +383,10 @@ class Lexer:
         self.debug_flag = debug_flag
         self.init_pointer()
 
-    def debug(self, msg):
-        # display debug message
+    def debug(self, msg, *args):
+        # display debug message, formatted only when it is displayed
         if self.debug_flag:
-            print("DEBUG: {}".format(msg))
+            print("DEBUG: {}".format(msg.format(*args)))
         else:
             pass
 
@@ -123,6 +452,9 @@ class Lexer:
         # process what's left as token
         self.process_token(possible_token)
 
+        if self.stats is not None:
+            self.stats.count("tokens_lexed", len(self.tokens))
+
     def init_pointer(self):
         # set pointer to point at the first char
         if len(self.source_code) >= 1:
@@ -157,7 +489,7 @@ class Lexer:
 
     def process_token(self, possible_token):
         # debug verbose
-        self.debug("Got token to process: '{}'".format(possible_token))
+        self.debug("Got token to process: '{}'", possible_token)
 
         # token is a new line
         if possible_token in DataTypes.LINE_BREAKERS:
@@ -186,18 +518,386 @@ class Lexer:
             self.tokens.append(token)
         # token must be a variable
         else:
-            token = Token(DataTypes.VARIABLE, self.line_number, possible_token)
+            token = Token(DataTypes.VARIABLE, self.line_number, possible_token,
+                          self.symbols.intern(possible_token))
             self.tokens.append(token)
 
 
+class TableLexer:
+    """
+    Table-driven lexer for language 'PJ'.
+
+    Produces exactly the same token stream as <class Lexer>, but
+    instead of growing the token char by char it runs a precomputed
+    DFA over character classes and cuts tokens out of the source
+    as slices.
+
+    States describe what the pending (not yet emitted) token is:
+        EMPTY           nothing pending
+        NUMBER          digits
+        WORD            identifier, keyword or glued operator chars
+        *_SLASH         the same followed by a single '/'
+        COMMENT         skipping till the end of line
+    """
+
+    EMPTY = 0
+    NUMBER = 1
+    WORD = 2
+    SLASH = 3
+    NUMBER_SLASH = 4
+    WORD_SLASH = 5
+    COMMENT = 6
+
+    """ Actions taken on a transition """
+    EXTEND = 0
+    START = 1
+    EMIT_START = 2
+    EMIT_SINGLE = 3
+    EMIT = 4
+    EMIT_NEWLINE = 5
+    SKIP_COMMENT = 6
+    DIVIDE_START = 7
+    DIVIDE = 8
+    DIVIDE_NEWLINE = 9
+
+    """ What is emitted for the pending token of a state """
+    PENDING_NONE = 0
+    PENDING_NUMBER = 1
+    PENDING_WORD = 2
+    PENDING = [PENDING_NONE, PENDING_NUMBER, PENDING_WORD,
+               PENDING_NONE, PENDING_NUMBER, PENDING_WORD, PENDING_NONE]
+
+    CHAR_CLASSES = CharClass.build()
+
+    """ Transition table indexed by [state][char class] """
+    SLASH_ROW = [(DIVIDE_START, NUMBER), (DIVIDE_START, WORD), (DIVIDE_START, WORD),
+                 (SKIP_COMMENT, COMMENT), (DIVIDE, EMPTY), (DIVIDE_NEWLINE, EMPTY)]
+    TRANSITIONS = [
+        # EMPTY
+        [(START, NUMBER), (START, WORD), (EMIT_SINGLE, EMPTY),
+         (START, SLASH), (EMIT, EMPTY), (EMIT_NEWLINE, EMPTY)],
+        # NUMBER
+        [(EXTEND, NUMBER), (EMIT_START, WORD), (EMIT_SINGLE, EMPTY),
+         (EXTEND, NUMBER_SLASH), (EMIT, EMPTY), (EMIT_NEWLINE, EMPTY)],
+        # WORD
+        [(EXTEND, WORD), (EXTEND, WORD), (EMIT_SINGLE, EMPTY),
+         (EXTEND, WORD_SLASH), (EMIT, EMPTY), (EMIT_NEWLINE, EMPTY)],
+        # SLASH, NUMBER_SLASH, WORD_SLASH
+        SLASH_ROW,
+        SLASH_ROW,
+        SLASH_ROW,
+        # COMMENT
+        [(EXTEND, COMMENT), (EXTEND, COMMENT), (EXTEND, COMMENT),
+         (EXTEND, COMMENT), (EXTEND, COMMENT), (EMIT_NEWLINE, EMPTY)],
+    ]
+
+    @staticmethod
+    def build_skip_patterns(transitions, pending):
+        """
+        For every state find the char classes which leave the state
+        as it is and compile a pattern that finds the first char
+        of any other class, so runs of such chars are jumped over.
+        """
+        patterns = []
+        for state, row in enumerate(transitions):
+            stay = bytes(c for c, (action, next_state) in enumerate(row)
+                         if next_state == state and
+                         (action == TableLexer.EXTEND or
+                          action == TableLexer.EMIT and pending[state] == TableLexer.PENDING_NONE))
+            if len(stay) > 0:
+                patterns.append(re.compile(b"[^" + re.escape(stay) + b"]"))
+            else:
+                patterns.append(None)
+        return patterns
+
+    def __init__(self, source, debug_flag=True, symbols=None, stats=None):
+        self.source_code = source
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.stats = stats
+        self.line_number = 1 if len(source) >= 1 else 0
+        self.tokens = []
+        self.debug_flag = debug_flag
+
+    def debug(self, msg, *args):
+        # display debug message, formatted only when it is displayed
+        if self.debug_flag:
+            print("DEBUG: {}".format(msg.format(*args)))
+        else:
+            pass
+
+    def get_tokens(self):
+        # yield all tokens
+        for t in self.tokens:
+            yield t
+
+    def add_token(self, identifier, text, start, end, symbol=None):
+        # cut token out of the scanned text
+        self.tokens.append(Token(identifier, self.line_number, text[start:end], symbol))
+
+    def emit(self, mode, text, start, end):
+        # turn pending slice into token
+        if mode == self.PENDING_NONE or start >= end:
+            return
+        if mode == self.PENDING_NUMBER:
+            self.add_token(DataTypes.NUMBER, text, start, end)
+        else:
+            value = text[start:end]
+            identifier = DataTypes.FIXED_TOKENS.get(value)
+            if identifier is None:
+                self.add_token(DataTypes.VARIABLE, text, start, end, self.symbols.intern(value))
+            else:
+                self.add_token(identifier, text, start, end)
+
+    def analyze(self):
+        # run the DFA over the whole source
+        state, start = self.scan(self.source_code)
+        self.finish(self.source_code, state, start)
+
+        if self.stats is not None:
+            self.stats.count("tokens_lexed", len(self.tokens))
+
+    def scan(self, text, state=EMPTY, start=0, position=0):
+        # move through text from position and emit every token that is
+        # complete, return state and start of the token that is still pending
+        EXTEND, START, EMIT_START, EMIT_SINGLE, EMIT, EMIT_NEWLINE, SKIP_COMMENT, \
+            DIVIDE_START, DIVIDE, DIVIDE_NEWLINE = range(10)
+        classes = text.translate(self.CHAR_CLASSES).encode("latin-1")
+        transitions = self.TRANSITIONS
+        skip_patterns = self.SKIP_PATTERNS
+        pending = self.PENDING
+        emit = self.emit
+        add_token = self.add_token
+        fixed_tokens = DataTypes.FIXED_TOKENS
+        line_breaker = DataTypes.LINE_BREAKERS[0]
+        length = len(text)
+
+        while position < length:
+            action, next_state = transitions[state][classes[position]]
+
+            if action == EXTEND:
+                pass
+            elif action == START:
+                start = position
+            elif action == EMIT_START:
+                emit(pending[state], text, start, position)
+                start = position
+            elif action == EMIT_SINGLE:
+                emit(pending[state], text, start, position)
+                add_token(fixed_tokens[text[position]], text, position, position + 1)
+            elif action == EMIT:
+                emit(pending[state], text, start, position)
+            elif action == EMIT_NEWLINE:
+                emit(pending[state], text, start, position)
+                self.line_number += 1
+            elif action == SKIP_COMMENT:
+                # everything is a comment till the end of line
+                emit(pending[state], text, start, position - 1)
+                position = text.find(line_breaker, position)
+                if position < 0:
+                    position = length
+                state = next_state
+                continue
+            else:
+                # there was only one '/' and it was a division
+                emit(pending[state], text, start, position - 1)
+                add_token(fixed_tokens[text[position - 1]], text, position - 1, position)
+                if action == DIVIDE_START:
+                    start = position
+                elif action == DIVIDE_NEWLINE:
+                    self.line_number += 1
+
+            state = next_state
+            position += 1
+
+            # jump over the run of chars that don't change anything
+            if skip_patterns[state] is not None:
+                run_end = skip_patterns[state].search(classes, position)
+                position = run_end.start() if run_end is not None else length
+
+        return state, start
+
+    def finish(self, text, state, start):
+        # process what's left as token
+        if state in (self.SLASH, self.NUMBER_SLASH, self.WORD_SLASH):
+            self.emit(self.PENDING_WORD, text, start, len(text))
+        else:
+            self.emit(self.PENDING[state], text, start, len(text))
+
+
+class CompactLexer(TableLexer):
+    """
+    Table-driven lexer collecting tokens into <class TokenBuffer>.
+    """
+
+    def __init__(self, source, debug_flag=True, symbols=None, stats=None):
+        super().__init__(source, debug_flag, symbols, stats)
+        self.tokens = TokenBuffer(source)
+        self.kind_codes = DataTypes.KIND_CODES
+
+    def add_token(self, identifier, text, start, end, symbol=-1):
+        # remember only where the token is
+        self.tokens.append(self.kind_codes[identifier], self.line_number, start, end, symbol)
+
+
+class IncrementalLexer(CompactLexer):
+    """
+    Compact lexer keeping its tokens up to date with source edits.
+
+    A token never spans a line break and a comment ends at one, so the
+    DFA is in EMPTY state at every line start. An edit is re-lexed from
+    the start of its first line through the line break of its last line,
+    tokens of those lines are replaced and later tokens are left as they
+    are (see <class EditableTokenBuffer>).
+    """
+
+    def __init__(self, source, debug_flag=True, symbols=None, stats=None):
+        super().__init__(source, debug_flag, symbols, stats)
+        self.tokens = EditableTokenBuffer(source)
+
+    def edit(self, start, end, text):
+        """ Replace source[start:end] with text and return updated tokens """
+        source = self.source_code
+        line_breaker = DataTypes.LINE_BREAKERS[0]
+        buffer = self.tokens
+
+        # lines touched by the edit, line break included
+        region_start = source.rfind(line_breaker, 0, start) + 1
+        region_end = source.find(line_breaker, end)
+        region_end = len(source) if region_end < 0 else region_end + 1
+        first = buffer.find(region_start)
+        last = buffer.find(region_end)
+
+        # line number of the first touched line
+        if first > 0:
+            line_number = buffer.line(first - 1) + \
+                source.count(line_breaker, buffer.end(first - 1), region_start)
+        else:
+            line_number = 1 + source.count(line_breaker, 0, region_start)
+
+        new_source = source[:start] + text + source[end:]
+        region = new_source[region_start:region_end + len(text) - (end - start)]
+        self.debug("re-lexing {} chars from line {}", len(region), line_number)
+
+        lexer = CompactLexer(region, self.debug_flag, self.symbols)
+        lexer.line_number = line_number
+        lexer.analyze()
+        tokens = lexer.tokens
+        tokens.starts = array("I", [offset + region_start for offset in tokens.starts])
+        tokens.ends = array("I", [offset + region_start for offset in tokens.ends])
+
+        line_delta = region.count(line_breaker) - \
+            source.count(line_breaker, region_start, region_end)
+        if len(source) == 0 and len(new_source) > 0:
+            line_delta += 1
+        elif len(source) > 0 and len(new_source) == 0:
+            line_delta -= 1
+
+        buffer.replace(first, last, tokens, new_source, line_delta)
+        self.source_code = new_source
+        self.line_number = buffer.last_line
+        return buffer
+
+
+class StreamingLexer(TableLexer):
+    """
+    Table-driven lexer reading its source in fixed-size chunks.
+
+    Tokens are yielded as soon as the chunk they end in is scanned.
+    A token (or '/') cut by the chunk boundary is carried over and
+    completed with the next chunk, an open comment is carried over
+    as the DFA state, so memory depends on the chunk size and the
+    longest token only. Scanning goes on from the end of the carry,
+    but the carry is copied and translated to char classes again with
+    every chunk, so while it is longer than chunk_size the next read
+    is as long as the carry: a long token is copied a logarithmic
+    number of times and lexing it takes linear time.
+    """
+
+    CHUNK_SIZE = 1 << 16
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE, debug_flag=True, symbols=None, stats=None):
+        super().__init__("", debug_flag, symbols, stats)
+        self.stream = stream
+        self.chunk_size = chunk_size
+
+    def get_tokens(self):
+        # scan chunk by chunk and yield tokens lazily
+        state = self.EMPTY
+        carry = ""
+
+        while True:
+            chunk = self.stream.read(max(self.chunk_size, len(carry)))
+            if len(chunk) == 0:
+                break
+            if self.line_number == 0:
+                self.line_number = 1
+
+            text = carry + chunk
+            state, start = self.scan(text, state, 0, len(carry))
+            carry = text[start:] if self.PENDING[state] != self.PENDING_NONE or \
+                state == self.SLASH else ""
+
+            tokens, self.tokens = self.tokens, []
+            self.debug("chunk of {} chars gave {} tokens", len(chunk), len(tokens))
+            if self.stats is not None:
+                self.stats.count("tokens_lexed", len(tokens))
+            for t in tokens:
+                yield t
+
+        self.finish(carry, state, 0)
+        tokens, self.tokens = self.tokens, []
+        if self.stats is not None:
+            self.stats.count("tokens_lexed", len(tokens))
+        for t in tokens:
+            yield t
+
+
+TableLexer.SKIP_PATTERNS = TableLexer.build_skip_patterns(
+    TableLexer.TRANSITIONS, TableLexer.PENDING)
+
+
+ENGINES = {
+    "classic": Lexer,
+    "table": TableLexer,
+    "compact": CompactLexer
+}
+
+
 def main():
-    source = sys.stdin.read()
+    arg_parser = argparse.ArgumentParser(description="Lexical analyzer for language 'PJ'")
+    arg_parser.add_argument("source", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
+                            help="source file (default: stdin)")
+    arg_parser.add_argument("--engine", choices=ENGINES.keys(), default="compact",
+                            help="lexing engine (default: compact)")
+    arg_parser.add_argument("--stream", action="store_true",
+                            help="read source in chunks and print tokens as they are found")
+    arg_parser.add_argument("--chunk-size", type=int, default=StreamingLexer.CHUNK_SIZE,
+                            help="chunk size in chars for --stream")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write phase timings and counters as JSON to stderr")
+    args = arg_parser.parse_args()
+
+    stats = Stats() if args.stats else None
+
+    if args.stream:
+        l = StreamingLexer(args.source, args.chunk_size, debug_flag=False, stats=stats)
+        with stats.phase("lexer") if stats else nullcontext():
+            for token in l.get_tokens():
+                print(token)
+    else:
+        with stats.phase("read") if stats else nullcontext():
+            source = args.source.read()
+
+        l = ENGINES[args.engine](source, debug_flag=False, stats=stats)
+        with stats.phase("lexer") if stats else nullcontext():
+            l.analyze()
 
-    l = Lexer(source, debug_flag=False)
-    l.analyze()
+        with stats.phase("output") if stats else nullcontext():
+            for token in l.get_tokens():
+                print(token)
 
-    for token in l.get_tokens():
-        print(token)
+    if stats is not None:
+        stats.dump()
 
 
 if __name__ == "__main__":
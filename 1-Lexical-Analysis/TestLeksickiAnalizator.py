@@ -0,0 +1,139 @@
+import io
+import json
+import random
+import unittest
+from contextlib import redirect_stderr
+
+from LeksickiAnalizator import CompactLexer, EditableTokenBuffer, IncrementalLexer, Stats, \
+    StreamingLexer
+
+
+def lex(source):
+    """ Tokens of a full run with their offsets in the source """
+    lexer = CompactLexer(source, False)
+    lexer.analyze()
+    tokens = lexer.tokens
+    return [(str(token), tokens.starts[token.index], tokens.ends[token.index])
+            for token in tokens]
+
+
+class IncrementalLexerTest(unittest.TestCase):
+
+    SOURCE = "a = 1\nza i od 1 do a // petlja\n b = a * i\naz\nrez = b\n"
+
+    def assertRelexed(self, lexer):
+        tokens = lexer.tokens
+        # runs start at increasing indices of tokens, the first one at 0
+        self.assertEqual(tokens.runs, sorted(set(tokens.runs)))
+        self.assertEqual(tokens.runs[0], 0)
+        self.assertLess(tokens.runs[-1], max(len(tokens), 1))
+        self.assertEqual([(str(token), tokens.start(token.index), tokens.end(token.index))
+                          for token in tokens], lex(lexer.source_code))
+        full = CompactLexer(lexer.source_code, False)
+        full.analyze()
+        self.assertEqual(lexer.line_number, full.line_number)
+
+    def edit(self, lexer, start, end, text):
+        lexer.edit(start, end, text)
+        self.assertRelexed(lexer)
+
+    def analyzed(self, source):
+        lexer = IncrementalLexer(source, False)
+        lexer.analyze()
+        return lexer
+
+    def test_merge_and_split_tokens(self):
+        lexer = self.analyzed(self.SOURCE)
+        # 'rez = b' becomes 'rezb' and is split again
+        at = self.SOURCE.index("rez")
+        self.edit(lexer, at + 3, at + 6, "")
+        self.edit(lexer, at + 2, at + 2, " ")
+        # '1 do' becomes '1do' and a number is split by an operator
+        at = lexer.source_code.index(" do")
+        self.edit(lexer, at, at + 1, "")
+        self.edit(lexer, 4, 4, "2+")
+
+    def test_comments_and_line_breaks(self):
+        lexer = self.analyzed(self.SOURCE)
+        # a comment hides the rest of its line, and a line break ends it
+        at = self.SOURCE.index("b = a")
+        self.edit(lexer, at, at, "//")
+        self.edit(lexer, at + 1, at + 1, "\n")
+        self.edit(lexer, at, at + 3, "")
+        at = lexer.source_code.index("\naz")
+        self.edit(lexer, at, at + 1, "\n\n\n")
+        self.edit(lexer, 0, lexer.source_code.index("za"), "")
+
+    def test_start_and_end_of_source(self):
+        lexer = self.analyzed(self.SOURCE)
+        self.edit(lexer, 0, 0, "x = 2\n")
+        self.edit(lexer, 0, 1, "xy")
+        end = len(lexer.source_code)
+        self.edit(lexer, end, end, "y = x")
+        end = len(lexer.source_code)
+        self.edit(lexer, end - 1, end, "xy\n")
+        self.edit(lexer, 0, len(lexer.source_code), "")
+        self.edit(lexer, 0, 0, "a")
+        self.edit(lexer, 1, 1, " = 1\nb = a")
+
+    def test_edits_past_max_runs(self):
+        lexer = self.analyzed(self.SOURCE * 100)
+        buffer = lexer.tokens
+        generator = random.Random(4)
+        texts = ["", " ", "\n", "a", "12", "+ b", "//", "za i od 1 do 2\n", "az\n"]
+        runs = 0
+        for _ in range(3 * EditableTokenBuffer.MAX_RUNS):
+            start = generator.randrange(len(lexer.source_code) + 1)
+            end = min(start + generator.randrange(4), len(lexer.source_code))
+            lexer.edit(start, end, generator.choice(texts))
+            runs = max(runs, len(buffer.runs))
+            self.assertLessEqual(len(buffer.runs), EditableTokenBuffer.MAX_RUNS)
+        self.assertEqual(runs, EditableTokenBuffer.MAX_RUNS)
+        self.assertRelexed(lexer)
+
+
+class CountingStream(io.StringIO):
+    """ Text stream counting its reads """
+
+    def __init__(self, text):
+        super().__init__(text)
+        self.reads = 0
+
+    def read(self, size=-1):
+        self.reads += 1
+        return super().read(size)
+
+
+class StreamingLexerTest(unittest.TestCase):
+
+    def streamed(self, source, chunk_size):
+        stream = CountingStream(source)
+        tokens = [str(token) for token in StreamingLexer(stream, chunk_size, False).get_tokens()]
+        self.assertEqual(tokens, [token for token, _, _ in lex(source)])
+        return stream.reads
+
+    def test_chunk_boundaries(self):
+        source = "// brojac\nza i od 1 do 10 //x\n\tb=i/2//c\n a = b / / 3\naz\nrez = 012/a"
+        for chunk_size in range(1, 12):
+            self.streamed(source, chunk_size)
+
+    def test_long_tokens(self):
+        # the reads grow with the carried token instead of one per chunk
+        length = 20000
+        reads = self.streamed("a = " + "x" * length + " + " + "7" * length + "\n", 4)
+        self.assertLess(reads, 50)
+
+
+class StatsTest(unittest.TestCase):
+
+    def test_dump_to_redirected_stderr(self):
+        stats = Stats()
+        stats.count("tokens_lexed", 3)
+        stream = io.StringIO()
+        with redirect_stderr(stream):
+            stats.dump()
+        self.assertEqual(json.loads(stream.getvalue())["counters"], {"tokens_lexed": 3})
+
+
+if __name__ == "__main__":
+    unittest.main()
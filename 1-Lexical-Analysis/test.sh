@@ -4,6 +4,8 @@ TEST_FOLDER="tests"
 
 for t in $TEST_FOLDER/*;
 do
-    python3.8 LeksickiAnalizator.py < $t/test.in > /tmp/test.out
+    python3.8 LeksickiAnalizator.py $(cat $t/test.args 2>/dev/null) < $t/test.in > /tmp/test.out
     diff -s $t/test.out /tmp/test.out
 done
+
+python3.8 -m unittest -q TestLeksickiAnalizator
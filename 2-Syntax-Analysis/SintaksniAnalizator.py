@@ -1,4 +1,20 @@
+import argparse
+import gc
+import io
+import mmap
+import os
+import re
+import struct
 import sys
+from array import array
+from contextlib import nullcontext
+
+LEXER_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                os.pardir, "1-Lexical-Analysis"))
+if LEXER_DIRECTORY not in sys.path:
+    sys.path.insert(0, LEXER_DIRECTORY)
+
+from LeksickiAnalizator import Stats, SymbolTable  # noqa: E402
 
 
 class Grammar:
@@ -54,37 +70,190 @@ class Grammar:
     L_ZAGRADA = "L_ZAGRADA"
     D_ZAGRADA = "D_ZAGRADA"
 
+    """ Nonterminals <class AST> """
+    PROGRAM = "<program>"
+    OPERATIONS_LIST = "<lista_naredbi>"
+    OPERATION = "<naredba>"
+    OPERATION_COMPOUND = "<naredba_pridruzivanja>"
+    OPERATION_LOOP = "<za_petlja>"
+    EXPRESSION = "<E>"
+    EXPRESSION_LIST = "<E_lista>"
+    TERM = "<T>"
+    TERM_LIST = "<T_lista>"
+    PRIMARY = "<P>"
+    NONTERMINALS = [PROGRAM, OPERATIONS_LIST, OPERATION, OPERATION_COMPOUND, OPERATION_LOOP,
+                    EXPRESSION, EXPRESSION_LIST, TERM, TERM_LIST, PRIMARY]
+
+    """ Terminals, None stands for end of input (⏊) """
+    BROJ = "BROJ"
+    TERMINALS = [IDN, BROJ, KR_ZA, KR_OD, KR_DO, KR_AZ, OP_PRIDRUZI, OP_PLUS,
+                 OP_MINUS, OP_PUTA, OP_DIJELI, L_ZAGRADA, D_ZAGRADA, None]
+
+    """ Productions of the grammar above, empty right side is $ """
+    PRODUCTIONS = [
+        (PROGRAM, [OPERATIONS_LIST]),
+        (OPERATIONS_LIST, [OPERATION, OPERATIONS_LIST]),
+        (OPERATIONS_LIST, []),
+        (OPERATION, [OPERATION_COMPOUND]),
+        (OPERATION, [OPERATION_LOOP]),
+        (OPERATION_COMPOUND, [IDN, OP_PRIDRUZI, EXPRESSION]),
+        (OPERATION_LOOP, [KR_ZA, IDN, KR_OD, EXPRESSION, KR_DO, EXPRESSION,
+                          OPERATIONS_LIST, KR_AZ]),
+        (EXPRESSION, [TERM, EXPRESSION_LIST]),
+        (EXPRESSION_LIST, [OP_PLUS, EXPRESSION]),
+        (EXPRESSION_LIST, [OP_MINUS, EXPRESSION]),
+        (EXPRESSION_LIST, []),
+        (TERM, [PRIMARY, TERM_LIST]),
+        (TERM_LIST, [OP_PUTA, TERM]),
+        (TERM_LIST, [OP_DIJELI, TERM]),
+        (TERM_LIST, []),
+        (PRIMARY, [OP_PLUS, PRIMARY]),
+        (PRIMARY, [OP_MINUS, PRIMARY]),
+        (PRIMARY, [L_ZAGRADA, EXPRESSION, D_ZAGRADA]),
+        (PRIMARY, [IDN]),
+        (PRIMARY, [BROJ]),
+    ]
+
+    """
+    Everything below is computed from PRODUCTIONS when the module
+    is imported, see Grammar.build()
+
+    FIRST and FOLLOW sets of nonterminals ($ in FIRST is EPSILON)
+    """
+    EPSILON = "$"
+    FIRST = None
+    FOLLOW = None
+
+    """
+    Parse table on integer codes: PARSE_TABLE[nonterminal][terminal] is
+    the right side (reversed, as symbol codes) of the production to use
+    or None. Terminal codes come before nonterminal codes.
+    """
+    SYMBOLS = TERMINALS + NONTERMINALS
+    SYMBOL_CODES = {symbol: code for code, symbol in enumerate(SYMBOLS)}
+    UNKNOWN = len(SYMBOLS)
+    PARSE_TABLE = None
+
     """ List of valid operations <lista_naredbi> """
-    OPERATIONS_LIST_VALID_OPTIONS = ["IDN", "KR_ZA", "KR_AZ", None]
-    OPERATIONS_LIST_VALID_END_OPTIONS = ["KR_AZ", None]
+    OPERATIONS_LIST_VALID_OPTIONS = None
+    OPERATIONS_LIST_VALID_END_OPTIONS = None
 
     """ Expressions table <E> and expressions list table <E_lista> """
-    EXPRESSION_VALID_OPTIONS = ["IDN", "BROJ",
-                                "OP_PLUS", "OP_MINUS", "L_ZAGRADA"]
-    EXPRESSION_LIST_VALID_END_OPTIONS = [
-        "IDN", "KR_ZA", "KR_DO", "KR_AZ", "D_ZAGRADA", None]
-    EXPRESSION_LIST_VALID_OPTIONS = [
-        "OP_PLUS", "OP_MINUS"] + EXPRESSION_LIST_VALID_END_OPTIONS
+    EXPRESSION_VALID_OPTIONS = None
+    EXPRESSION_LIST_VALID_END_OPTIONS = None
+    EXPRESSION_LIST_VALID_OPTIONS = None
 
     """ Terms table <T> and terms list table <T_lista> """
-    TERM_VALID_OPTIONS = ["IDN", "BROJ", "OP_PLUS", "OP_MINUS", "L_ZAGRADA"]
-    TERM_LIST_VALID_END_OPTIONS = ["IDN", "KR_ZA", "KR_DO",
-                                   "KR_AZ", "OP_PLUS", "OP_MINUS", "D_ZAGRADA", None]
-    TERM_LIST_VALID_OPTIONS = ["OP_PUTA",
-                               "OP_DIJELI"] + TERM_LIST_VALID_END_OPTIONS
+    TERM_VALID_OPTIONS = None
+    TERM_LIST_VALID_END_OPTIONS = None
+    TERM_LIST_VALID_OPTIONS = None
 
     """ Primaries table <P> """
-    PRIMARY_VALID_OPTIONS = ["OP_PLUS", "OP_MINUS", "L_ZAGRADA", "IDN", "BROJ"]
-    PRIMARY_VALID_END_OPTIONS = ["IDN", "BROJ"]
+    PRIMARY_VALID_OPTIONS = None
+    PRIMARY_VALID_END_OPTIONS = None
+
+    @staticmethod
+    def first_of(symbols, first):
+        """ FIRST set of a sequence of grammar symbols """
+        result = set()
+        for symbol in symbols:
+            if symbol not in first:
+                result.add(symbol)
+                return result
+            result |= first[symbol] - {Grammar.EPSILON}
+            if Grammar.EPSILON not in first[symbol]:
+                return result
+        result.add(Grammar.EPSILON)
+        return result
+
+    @staticmethod
+    def first_sets():
+        first = {nonterminal: set() for nonterminal in Grammar.NONTERMINALS}
+        changed = True
+        while changed:
+            changed = False
+            for left, right in Grammar.PRODUCTIONS:
+                size = len(first[left])
+                first[left] |= Grammar.first_of(right, first)
+                changed = changed or len(first[left]) != size
+        return first
+
+    @staticmethod
+    def follow_sets(first):
+        follow = {nonterminal: set() for nonterminal in Grammar.NONTERMINALS}
+        follow[Grammar.PROGRAM].add(None)
+        changed = True
+        while changed:
+            changed = False
+            for left, right in Grammar.PRODUCTIONS:
+                for i, symbol in enumerate(right):
+                    if symbol not in follow:
+                        continue
+                    size = len(follow[symbol])
+                    rest = Grammar.first_of(right[i + 1:], first)
+                    follow[symbol] |= rest - {Grammar.EPSILON}
+                    if Grammar.EPSILON in rest:
+                        follow[symbol] |= follow[left]
+                    changed = changed or len(follow[symbol]) != size
+        return follow
+
+    @staticmethod
+    def build():
+        """ Compute FIRST, FOLLOW, the parse table and option sets """
+        G = Grammar
+        G.FIRST = G.first_sets()
+        G.FOLLOW = G.follow_sets(G.FIRST)
+
+        predict = {nonterminal: dict() for nonterminal in G.NONTERMINALS}
+        for left, right in G.PRODUCTIONS:
+            options = G.first_of(right, G.FIRST)
+            if G.EPSILON in options:
+                options = (options - {G.EPSILON}) | G.FOLLOW[left]
+            for option in options:
+                if option in predict[left]:
+                    raise ValueError(f"grammar is not LL(1): {left} on {option}")
+                predict[left][option] = right
+
+        G.PARSE_TABLE = [[None] * (G.UNKNOWN + 1) for _ in G.NONTERMINALS]
+        for left, row in predict.items():
+            for option, right in row.items():
+                G.PARSE_TABLE[G.SYMBOL_CODES[left] - len(G.TERMINALS)][G.SYMBOL_CODES[option]] = \
+                    tuple(G.SYMBOL_CODES[symbol] for symbol in reversed(right))
+
+        def options(nonterminal):
+            return frozenset(predict[nonterminal].keys())
+
+        def end_options(nonterminal):
+            return frozenset(option for option, right in predict[nonterminal].items()
+                             if len(right) == 0)
+
+        G.OPERATIONS_LIST_VALID_OPTIONS = options(G.OPERATIONS_LIST)
+        G.OPERATIONS_LIST_VALID_END_OPTIONS = end_options(G.OPERATIONS_LIST)
+        G.EXPRESSION_VALID_OPTIONS = options(G.EXPRESSION)
+        G.EXPRESSION_LIST_VALID_END_OPTIONS = end_options(G.EXPRESSION_LIST)
+        G.EXPRESSION_LIST_VALID_OPTIONS = options(G.EXPRESSION_LIST)
+        G.TERM_VALID_OPTIONS = options(G.TERM)
+        G.TERM_LIST_VALID_END_OPTIONS = end_options(G.TERM_LIST)
+        G.TERM_LIST_VALID_OPTIONS = options(G.TERM_LIST)
+        G.PRIMARY_VALID_OPTIONS = options(G.PRIMARY)
+        G.PRIMARY_VALID_END_OPTIONS = frozenset(
+            option for option, right in predict[G.PRIMARY].items()
+            if len(right) == 1 and right[0] not in predict)
+
+
+Grammar.build()
 
 
 class Token:
     """ Token data class """
 
-    def __init__(self, identifier, line_number, value):
+    __slots__ = ("identifier", "line_number", "value", "symbol")
+
+    def __init__(self, identifier, line_number, value, symbol=None):
         self.identifier = identifier
         self.line_number = line_number
         self.value = value
+        self.symbol = symbol
 
     def __repr__(self):
         return "{} {} {}".format(self.identifier,
@@ -95,6 +264,98 @@ class Token:
                                  self.line_number, self.value)
 
 
+class TokenReader:
+    """
+    Bulk reader of the lexer text format, one token per line:
+
+        <identifier> <line_number> <value>
+
+    The whole input is read (or memory-mapped) as bytes and decoded at once,
+    line ends are translated as by a text mode read. One regular expression
+    match checks that every line has the three fields, then a single split
+    on spaces gives the fields of all tokens, other whitespace stays in the
+    fields as in the line by line split. Line numbers become integers and
+    identifiers are interned strings. Tokens are created with the garbage
+    collector paused, they cannot form cycles.
+
+    If some line is malformed, the input is read again line by line:
+    well-formed lines still become tokens, empty lines are skipped and
+    every malformed line is recorded in errors as
+    (line in the input, byte offset of the line, line text).
+    """
+
+    TOKEN_LINE = re.compile(r"([^ \n]+) ([0-9]+) ([^ \n]+)")
+    TOKEN_LINES = re.compile(r"(?:[^ \n]+ [0-9]+ [^ \n]+\n)*(?:[^ \n]+ [0-9]+ [^ \n]+)?")
+
+    def __init__(self, symbols=None, stats=None):
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.stats = stats
+        self.errors = list()
+
+    def read_file(self, path, use_mmap=False):
+        """ Read tokens from a file, optionally memory-mapped """
+        with open(path, "rb") as f:
+            if not use_mmap or os.fstat(f.fileno()).st_size == 0:
+                return self.read(f.read())
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                view = memoryview(data)
+                try:
+                    return self.read(view)
+                finally:
+                    view.release()
+
+    def read(self, data):
+        """ List of tokens from lexer output as a bytes-like object """
+        text = str(data, "utf-8")
+        if "\r" in text:
+            text = text.replace("\r\n", "\n").replace("\r", "\n")
+
+        if self.TOKEN_LINES.fullmatch(text) is not None:
+            if text.endswith("\n"):
+                text = text[:-1]
+            fields = text.replace("\n", " ").split(" ") if len(text) > 0 else []
+            identifiers = list(map(sys.intern, fields[0::3]))
+            line_numbers = map(int, fields[1::3])
+            values = fields[2::3]
+        else:
+            identifiers, line_numbers, values = self.read_lines(data)
+
+        intern = self.symbols.intern
+        idn = Grammar.IDN
+        symbols = [intern(value) if identifier == idn else None
+                   for identifier, value in zip(identifiers, values)]
+
+        collecting = gc.isenabled()
+        gc.disable()
+        try:
+            tokens = list(map(Token, identifiers, line_numbers, values, symbols))
+        finally:
+            if collecting:
+                gc.enable()
+
+        if self.stats is not None:
+            self.stats.count("tokens_read", len(tokens))
+        return tokens
+
+    def read_lines(self, data):
+        """ Fields of well-formed lines, malformed lines go to errors """
+        identifiers = list()
+        line_numbers = list()
+        values = list()
+        offset = 0
+        for index, line in enumerate(bytes(data).splitlines(True)):
+            text = str(line, "utf-8").rstrip("\r\n")
+            match = self.TOKEN_LINE.fullmatch(text)
+            if match is not None:
+                identifiers.append(sys.intern(match.group(1)))
+                line_numbers.append(int(match.group(2)))
+                values.append(match.group(3))
+            elif len(text) > 0:
+                self.errors.append((index + 1, offset, text))
+            offset += len(line)
+        return identifiers, line_numbers, values
+
+
 class AST:
     """ Abstract syntax tree """
 
@@ -102,21 +363,232 @@ class AST:
         self.node_name = node_name
         self.node_children = node_children
 
-    def __repr__(self, margin_size=0):
-        s = f"{' '*margin_size}{self.node_name}\n"
-        if len(self.node_children) == 0 or self.node_children[0] is None:
-            s += f"{' '*margin_size} $\n"
-        else:
-            for child in self.node_children:
-                if isinstance(child, Token):
-                    s += f"{' '*margin_size} {child.__repr__()}\n"
-                else:
-                    s += f"{child.__repr__(margin_size+1)}"
-        return s
+    """ Lines collected before they are written out """
+    WRITE_BUFFER_LINES = 4096
+
+    def __repr__(self):
+        s = io.StringIO()
+        self.write(s)
+        return s.getvalue()
 
     def __str__(self):
         return self.__repr__()
 
+    def write(self, stream):
+        """
+        Write the tree to stream, one node or token per line,
+        indented by one space per level, $ for empty productions.
+
+        The tree is walked with an explicit stack and lines are
+        written in chunks, so neither the depth nor the size of
+        the tree is limited by recursion or memory for the output.
+        """
+        lines = []
+        stack = [(self, 0)]
+
+        while len(stack) > 0:
+            item, margin = stack.pop()
+
+            if isinstance(item, AST):
+                lines.append(" " * margin + item.node_name + "\n")
+                children = item.node_children
+                if len(children) == 0 or children[0] is None:
+                    stack.append((None, margin + 1))
+                else:
+                    for child in reversed(children):
+                        stack.append((child, margin + 1))
+            elif item is None:
+                lines.append(" " * margin + "$\n")
+            else:
+                lines.append(" " * margin + repr(item) + "\n")
+
+            if len(lines) >= self.WRITE_BUFFER_LINES:
+                stream.write("".join(lines))
+                lines = []
+
+        stream.write("".join(lines))
+
+    def count_nodes(self):
+        """ Number of AST nodes in the tree """
+        nodes = 0
+        stack = [self]
+        while len(stack) > 0:
+            node = stack.pop()
+            nodes += 1
+            for child in node.node_children:
+                if isinstance(child, AST):
+                    stack.append(child)
+        return nodes
+
+
+class BinaryAST:
+    """
+    Binary interchange format of AST for the later phases.
+
+    All numbers are little endian, entries are nodes, tokens and
+    empty productions ($) of the tree in preorder:
+
+        header    MAGIC, kinds, entries, tokens, strings, string bytes
+        kinds     entries x B     kind (string index) of every entry
+        arity     entries x B     number of children, 0 for tokens and $
+        padding   to 4 bytes
+        lines     tokens x I      line numbers of tokens
+        values    tokens x I      string index of token values
+        offsets   strings + 1 x I start of every string
+        strings   UTF-8 string bytes
+
+    The first strings are the kind names (nonterminals, token identifiers
+    and $), the file is read back without knowing the grammar of the writer.
+    Typed arrays are memory-mapped and used in place when loading.
+    """
+
+    MAGIC = b"PJAST\x00\x00\x01"
+    HEADER = struct.Struct("<8sIIIII")
+
+    @staticmethod
+    def dump(root, stream):
+        """ Write the AST root to a binary stream """
+        kind_codes = dict()
+        value_codes = dict()
+        kinds = array("B")
+        arity = array("B")
+        lines = array("I")
+        values = array("I")
+
+        def kind_code(name):
+            code = kind_codes.get(name)
+            if code is None:
+                code = kind_codes[name] = len(kind_codes)
+            return code
+
+        epsilon = kind_code(Grammar.EPSILON)
+        stack = [root]
+
+        while len(stack) > 0:
+            item = stack.pop()
+
+            if isinstance(item, AST):
+                kinds.append(kind_code(item.node_name))
+                children = item.node_children
+                if len(children) == 0 or children[0] is None:
+                    arity.append(1)
+                    stack.append(None)
+                else:
+                    arity.append(len(children))
+                    stack.extend(reversed(children))
+            elif item is None:
+                kinds.append(epsilon)
+                arity.append(0)
+            else:
+                kinds.append(kind_code(item.identifier))
+                arity.append(0)
+                lines.append(int(item.line_number))
+                value = value_codes.get(item.value)
+                if value is None:
+                    value = value_codes[item.value] = len(value_codes)
+                values.append(value)
+
+        for i in range(len(values)):
+            values[i] += len(kind_codes)
+
+        strings = [name.encode("utf-8") for name in kind_codes] + \
+                  [value.encode("utf-8") for value in value_codes]
+        offsets = array("I", [0])
+        for string in strings:
+            offsets.append(offsets[-1] + len(string))
+
+        if sys.byteorder != "little":
+            for numbers in (lines, values, offsets):
+                numbers.byteswap()
+
+        stream.write(BinaryAST.HEADER.pack(BinaryAST.MAGIC, len(kind_codes), len(kinds),
+                                           len(lines), len(strings), offsets[-1]))
+        stream.write(kinds.tobytes())
+        stream.write(arity.tobytes())
+        stream.write(bytes(-2 * len(kinds) % 4))
+        stream.write(lines.tobytes())
+        stream.write(values.tobytes())
+        stream.write(offsets.tobytes())
+        stream.write(b"".join(strings))
+
+    @staticmethod
+    def load(path, symbols=None):
+        """ Memory-map the binary AST file and rebuild the AST root """
+        with open(path, "rb") as f, \
+                mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            view = memoryview(data)
+            try:
+                return BinaryAST.from_buffer(view, symbols)
+            finally:
+                view.release()
+
+    @staticmethod
+    def from_buffer(view, symbols=None):
+        """ Rebuild the AST root from a buffer in binary AST format """
+        header = BinaryAST.HEADER
+        magic, kind_count, entries, token_count, string_count, string_size = \
+            header.unpack_from(view, 0)
+        if magic != BinaryAST.MAGIC:
+            raise ValueError("not a binary AST file")
+
+        def numbers(start, count, code):
+            end = start + count * (4 if code == "I" else 1)
+            if end > len(view):
+                raise ValueError("binary AST file is truncated")
+            if code == "I" and sys.byteorder != "little":
+                swapped = array("I", view[start:end])
+                swapped.byteswap()
+                return swapped, end
+            return view[start:end].cast(code), end
+
+        kinds, position = numbers(header.size, entries, "B")
+        arity, position = numbers(position, entries, "B")
+        position += -position % 4
+        lines, position = numbers(position, token_count, "I")
+        values, position = numbers(position, token_count, "I")
+        offsets, position = numbers(position, string_count + 1, "I")
+        if position + string_size > len(view):
+            raise ValueError("binary AST file is truncated")
+        strings = [str(view[position + offsets[i]:position + offsets[i + 1]], "utf-8")
+                   for i in range(string_count)]
+
+        symbols = symbols if symbols is not None else SymbolTable()
+        epsilon = strings[:kind_count].index(Grammar.EPSILON)
+        root = None
+        stack = []
+        token_index = 0
+
+        try:
+            for i in range(entries):
+                kind = kinds[i]
+                if kind == epsilon:
+                    item = None
+                elif arity[i] > 0:
+                    item = AST(strings[kind], [])
+                else:
+                    value = strings[values[token_index]]
+                    identifier = strings[kind]
+                    symbol = symbols.intern(value) if identifier == Grammar.IDN else None
+                    item = Token(identifier, lines[token_index], value, symbol)
+                    token_index += 1
+
+                if len(stack) == 0:
+                    root = item
+                else:
+                    frame = stack[-1]
+                    frame[0].node_children.append(item)
+                    frame[1] -= 1
+                    if frame[1] == 0:
+                        stack.pop()
+                if item is not None and arity[i] > 0:
+                    stack.append([item, arity[i]])
+        finally:
+            for numbers in (kinds, arity, lines, values, offsets):
+                if isinstance(numbers, memoryview):
+                    numbers.release()
+
+        return root
+
 
 class ParserException(Exception):
     """
@@ -141,23 +613,26 @@ class ParserException(Exception):
 class Parser:
     """ Language 'PJ' parser """
 
-    def __init__(self, tokens, debug_flag=False):
+    def __init__(self, tokens, debug_flag=False, symbols=None, stats=None):
         self.tokens = tokens
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.stats = stats
         self.debug_flag = debug_flag
         self.total_tokens = 0
         self.current_token_index = -1
         self.current_token = None
         self.ast_root = None
 
-    def debug(self, msg):
+    def debug(self, msg, *args):
+        """ Print debug message, formatted only when it is printed """
         if self.debug_flag:
-            print("DEBUG: {}".format(str(msg)))
+            print("DEBUG: {}".format(str(msg).format(*args)))
         else:
             pass
 
-    def print_ast_tree(self):
+    def print_ast_tree(self, stream=None):
         """ Print the whole AST program tree """
-        print(self.ast_root, end="")
+        self.ast_root.write(stream if stream is not None else sys.stdout)
 
     def init_parser(self):
         """ Initialize parser to eat the first token """
@@ -170,7 +645,7 @@ class Parser:
 
     def advance(self):
         """ Eat the next token """
-        self.debug(f"advancing from: {self.current_token}")
+        self.debug("advancing from: {}", self.current_token)
 
         if self.current_token_index + 1 < len(self.tokens):
             self.current_token_index += 1
@@ -178,7 +653,7 @@ class Parser:
         else:
             self.current_token = None
 
-        self.debug(f"advanced to: {self.current_token}")
+        self.debug("advanced to: {}", self.current_token)
 
     def parse(self):
         """ Generate AST tree """
@@ -187,6 +662,10 @@ class Parser:
         program_tree = self.program()
         self.ast_root = program_tree
 
+        if self.stats is not None:
+            self.stats.count("tokens_parsed", len(self.tokens))
+            self.stats.count("ast_nodes", self.ast_root.count_nodes())
+
     def program(self):
         """
         Program: <program>
@@ -194,7 +673,7 @@ class Parser:
         Options:
             <lista_naredbi> = {IDN KR_ZA ⏊}
         """
-        self.debug("program starting: {}".format(self.current_token))
+        self.debug("program starting: {}", self.current_token)
 
         # empty program, so return empty tree
         if self.current_token is None:
@@ -221,7 +700,7 @@ class Parser:
             <naredba> <lista_naredbi> = {IDN KR_ZA}
             $ = {KR_AZ ⏊}
         """
-        self.debug("operations list: {}".format(self.current_token))
+        self.debug("operations list: {}", self.current_token)
 
         # end reached
         if self.current_token is None or self.current_token.identifier == Grammar.KR_AZ:
@@ -249,7 +728,7 @@ class Parser:
             <naredba_pridruzivanja> = {IDN}
             <za_petlja> = {KR_ZA}
         """
-        self.debug("operation {}".format(self.current_token))
+        self.debug("operation {}", self.current_token)
 
         if self.current_token is None:
             raise ParserException(self.current_token)
@@ -279,7 +758,7 @@ class Parser:
         Options:
             IDN OP_PRIDRUZI <E> = {IDN}
         """
-        self.debug("operation compound: {}".format(self.current_token))
+        self.debug("operation compound: {}", self.current_token)
 
         left_token = self.current_token
         self.advance()
@@ -301,7 +780,7 @@ class Parser:
         Options:
             KR_ZA IDN KR_OD <E> KR_DO <E> <lista_naredbi> KR_AZ = { KR_ZA }
         """
-        self.debug("operation loop: {}".format(self.current_token))
+        self.debug("operation loop: {}", self.current_token)
 
         loop_definition_start = self.current_token
         self.advance()
@@ -342,7 +821,7 @@ class Parser:
         Options:
             <T> <E_lista> = { IDN BROJ OP_PLUS OP_MINUS L_ZAGRADA }
         """
-        self.debug("expression: {}".format(self.current_token))
+        self.debug("expression: {}", self.current_token)
 
         # invalid token
         if self.current_token is None or \
@@ -364,7 +843,7 @@ class Parser:
             OP_MINUS <E> = { OP_MINUS }
             $ = { IDN KR_ZA KR_DO KR_AZ D_ZAGRADA ⏊ }
         """
-        self.debug("expression list: {}".format(self.current_token))
+        self.debug("expression list: {}", self.current_token)
 
         # end reached
         if self.current_token is None or \
@@ -398,7 +877,7 @@ class Parser:
         Options:
             <P> <T_lista> = { IDN BROJ OP_PLUS OP_MINUS L_ZAGRADA }
         """
-        self.debug("term: {}".format(self.current_token))
+        self.debug("term: {}", self.current_token)
 
         # invalid token
         if self.current_token is None or \
@@ -420,7 +899,7 @@ class Parser:
             OP_DIJELI <T> = { OP_DIJELI }
             $ = { IDN KR_ZA KR_DO KR_AZ OP_PLUS OP_MINUS D_ZAGRADA ⏊ }
         """
-        self.debug("term list: {}".format(self.current_token))
+        self.debug("term list: {}", self.current_token)
 
         # end reached
         if self.current_token is None or \
@@ -458,7 +937,7 @@ class Parser:
             IDN = { IDN }
             BROJ = { BROJ }
         """
-        self.debug("primary: {}".format(self.current_token))
+        self.debug("primary: {}", self.current_token)
 
         # invalid token
         if self.current_token is None or \
@@ -507,27 +986,199 @@ class Parser:
             raise ParserException(self.current_token)
 
 
-def main():
-    tokens = []
+class StackParser(Parser):
+    """
+    Language 'PJ' table-driven parser
+
+    Same AST and the same errors as <class Parser>, but instead of
+    recursive descent the LL(1) parse table (Grammar.PARSE_TABLE) is
+    driven by an explicit stack, so program length and expression
+    nesting are not limited by the Python recursion limit.
+
+    Stack entries are (grammar symbol code, AST node the symbol belongs to).
+    As in <class Parser> parsing stops when <program> is complete,
+    tokens left after it are not looked at.
+
+    With recover set, a syntax error does not stop parsing (panic mode):
+    the error is recorded in errors, tokens are skipped up to the start of
+    a statement (IDN followed by OP_PRIDRUZI, or KR_ZA), the KR_AZ of an
+    open loop or the end of input, and the stack is unwound to the
+    innermost <lista_naredbi> (or <program>). An IDN inside an expression
+    or a stray KR_AZ outside of any loop is skipped. Parsing ends at an
+    error at the end of input, ast_root is then the partial tree.
+
+    The partial tree lacks the children of the nodes an error cut short,
+    so main() prints only the errors: printed, it would read as a valid
+    AST to the semantic analyzer.
+    """
 
-    lexer_output = sys.stdin.read()
-    for line in lexer_output.split("\n"):
-        try:
-            (identifier, line_number, value) = line.split(" ")
-            tokens.append(Token(identifier, line_number, value))
-        except Exception:
-            break
+    def __init__(self, tokens, debug_flag=False, symbols=None, stats=None, recover=False):
+        super().__init__(tokens, debug_flag, symbols, stats)
+        self.recover = recover
+        self.errors = list()
+
+    def synchronize(self, stack, token):
+        """
+        Record the error at token and resynchronize the stack and the
+        input, return False if parsing cannot go on
+        """
+        error = ParserException(token)
+        if not self.recover:
+            raise error
+        self.errors.append(error)
+        self.debug("recovering from: {}", error)
+        if token is None:
+            return False
+
+        codes = Grammar.SYMBOL_CODES
+        statement_lists = (codes[Grammar.OPERATIONS_LIST], codes[Grammar.PROGRAM])
+        loop_end = codes[Grammar.KR_AZ]
+        loop_open = any(symbol == loop_end for symbol, _ in stack)
+
+        while self.current_token is not None and not self.statement_start(loop_open):
+            self.advance()
 
-    parser = Parser(tokens, debug_flag=False)
+        while len(stack) > 0 and stack[-1][0] not in statement_lists:
+            stack.pop()
+        return len(stack) > 0
+
+    def statement_start(self, loop_open):
+        """
+        Check if the current token starts a statement (IDN followed by
+        OP_PRIDRUZI or KR_ZA) or is the KR_AZ of an open loop
+        """
+        identifier = self.current_token.identifier
+        if identifier == Grammar.IDN:
+            index = self.current_token_index + 1
+            return index < len(self.tokens) and \
+                self.tokens[index].identifier == Grammar.OP_PRIDRUZI
+        if identifier == Grammar.KR_AZ:
+            return loop_open
+        return identifier == Grammar.KR_ZA
+
+    def parse(self):
+        """ Generate AST tree """
+        self.init_parser()
+
+        table = Grammar.PARSE_TABLE
+        symbols = Grammar.SYMBOLS
+        codes = Grammar.SYMBOL_CODES
+        unknown = Grammar.UNKNOWN
+        terminals = len(Grammar.TERMINALS)
+        root = AST(Grammar.PROGRAM, [])
+        stack = [(codes[Grammar.PROGRAM], None)]
+
+        # empty program, so return empty tree
+        if self.current_token is None:
+            root.node_children.append(None)
+            stack.pop()
+
+        while len(stack) > 0:
+            symbol, parent = stack.pop()
+            token = self.current_token
+            code = codes.get(token.identifier, unknown) if token is not None else codes[None]
+
+            # expand nonterminal by the production for the current token
+            if symbol >= terminals:
+                production = table[symbol - terminals][code]
+                if production is None:
+                    stack.append((symbol, parent))
+                    if not self.synchronize(stack, token):
+                        break
+                    continue
+                self.debug("{}: {}", symbols[symbol], token)
+
+                node = root if parent is None else AST(symbols[symbol], [])
+                if parent is not None:
+                    parent.node_children.append(node)
+                if len(production) == 0:
+                    node.node_children.append(None)
+                for child_symbol in production:
+                    stack.append((child_symbol, node))
+
+            # terminal must match the current token
+            else:
+                if code != symbol:
+                    if not self.synchronize(stack, token):
+                        break
+                    continue
+                parent.node_children.append(token)
+                self.advance()
+
+        self.ast_root = root
+
+        if self.stats is not None:
+            self.stats.count("tokens_parsed", len(self.tokens))
+            self.stats.count("ast_nodes", self.ast_root.count_nodes())
+
+
+ENGINES = {
+    "recursive": Parser,
+    "stack": StackParser
+}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Syntax analyzer for language 'PJ'")
+    arg_parser.add_argument("--engine", choices=ENGINES.keys(), default="stack",
+                            help="parsing engine (default: stack)")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write phase timings and counters as JSON to stderr")
+    arg_parser.add_argument("--binary", metavar="PATH",
+                            help="write the AST in binary format to PATH instead of printing it")
+    arg_parser.add_argument("--tokens", metavar="PATH",
+                            help="read lexer output from PATH instead of stdin")
+    arg_parser.add_argument("--mmap", action="store_true",
+                            help="memory-map the file given with --tokens")
+    arg_parser.add_argument("--recover", action="store_true",
+                            help="report every syntax error instead of stopping at the first, "
+                                 "the partial AST is not printed (stack engine only)")
+    args = arg_parser.parse_args()
+
+    if args.recover and args.engine != "stack":
+        arg_parser.error("--recover needs the stack engine")
+
+    stats = Stats() if args.stats else None
+    symbols = SymbolTable()
+    reader = TokenReader(symbols, stats)
 
     try:
-        parser.parse()
-        parser.print_ast_tree()
+        with stats.phase("read") if stats else nullcontext():
+            if args.tokens is not None:
+                tokens = reader.read_file(args.tokens, args.mmap)
+            else:
+                tokens = reader.read(sys.stdin.buffer.read())
+
+        if len(reader.errors) > 0:
+            for line, offset, text in reader.errors:
+                sys.stderr.write(f"malformed token at line {line} (byte {offset}): {text}\n")
+            exit(1)
+
+        if args.recover:
+            parser = StackParser(tokens, debug_flag=False, symbols=symbols, stats=stats,
+                                 recover=True)
+        else:
+            parser = ENGINES[args.engine](tokens, debug_flag=False, symbols=symbols, stats=stats)
+
+        with stats.phase("parser") if stats else nullcontext():
+            parser.parse()
+        if args.recover and len(parser.errors) > 0:
+            raise parser.errors[0]
+        with stats.phase("output") if stats else nullcontext():
+            if args.binary is not None:
+                with open(args.binary, "wb") as f:
+                    BinaryAST.dump(parser.ast_root, f)
+            else:
+                parser.print_ast_tree()
     except ParserException as e:
-        print(e)
+        for error in parser.errors if args.recover else [e]:
+            print(error)
     except Exception as e:
         print(e)
 
+    if stats is not None:
+        stats.dump()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,62 @@
+import io
+import sys
+import unittest
+
+# the syntax analyzer puts the lexer on sys.path
+from SintaksniAnalizator import AST, StackParser
+from LeksickiAnalizator import CompactLexer
+
+
+def parse(source):
+    lexer = CompactLexer(source, False)
+    lexer.analyze()
+    parser = StackParser(lexer.tokens)
+    parser.parse()
+    return parser.ast_root
+
+
+def written(tree):
+    stream = io.StringIO()
+    tree.write(stream)
+    return stream.getvalue()
+
+
+def written_recursively(item, margin=0):
+    """ The format of AST.write, one recursive call per level """
+    if item is None:
+        return " " * margin + "$\n"
+    if not isinstance(item, AST):
+        return " " * margin + repr(item) + "\n"
+    children = item.node_children
+    if len(children) == 0 or children[0] is None:
+        children = [None]
+    return " " * margin + item.node_name + "\n" + \
+        "".join(written_recursively(child, margin + 1) for child in children)
+
+
+class WriteTest(unittest.TestCase):
+
+    @staticmethod
+    def nested(depth):
+        return "rez = " + "(" * depth + "a * -1" + ")" * depth + "\nza i od 1 do rez\naz\n"
+
+    def test_format(self):
+        tree = parse(self.nested(5))
+        self.assertEqual(written(tree), written_recursively(tree))
+
+    def test_deeper_than_recursion_limit(self):
+        # every parenthesis nests <E> <T> <P>
+        depth = sys.getrecursionlimit() // 2
+        lines = written(parse(self.nested(depth))).splitlines()
+        margins = [len(line) - len(line.lstrip(" ")) for line in lines]
+        self.assertGreater(max(margins), sys.getrecursionlimit())
+        self.assertTrue(all(b <= a + 1 for a, b in zip(margins, margins[1:])))
+        opened = [margin for margin, line in zip(margins, lines) if line.endswith("L_ZAGRADA 1 (")]
+        closed = [margin for margin, line in zip(margins, lines) if line.endswith("D_ZAGRADA 1 )")]
+        self.assertEqual(opened, list(range(7, 7 + 3 * depth, 3)))
+        self.assertEqual(closed, opened[::-1])
+        self.assertEqual(lines[-3:], ["     KR_AZ 3 az", "   <lista_naredbi>", "    $"])
+
+
+if __name__ == "__main__":
+    unittest.main()
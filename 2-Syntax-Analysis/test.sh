@@ -4,6 +4,8 @@ TEST_FOLDER="tests"
 
 for t in $TEST_FOLDER/*;
 do
-    python3.8 SintaksniAnalizator.py < $t/test.in > /tmp/test.out
+    python3.8 SintaksniAnalizator.py $(cat $t/test.args 2>/dev/null) < $t/test.in > /tmp/test.out 2>&1
     diff -s $t/test.out /tmp/test.out
 done
+
+python3.8 -m unittest -q TestSintaksniAnalizator
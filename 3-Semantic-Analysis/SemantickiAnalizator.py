@@ -1,13 +1,28 @@
+import argparse
+import os
 import sys
+from contextlib import nullcontext
+
+LEXER_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                os.pardir, "1-Lexical-Analysis"))
+SYNTAX_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 os.pardir, "2-Syntax-Analysis"))
+for directory in (LEXER_DIRECTORY, SYNTAX_DIRECTORY):
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+
+from LeksickiAnalizator import Stats, SymbolTable  # noqa: E402
+from SintaksniAnalizator import BinaryAST  # noqa: E402
 
 
 class SemanticToken:
     """ Semantic token data class """
 
-    def __init__(self, ln_usage, ln_definition, value):
+    def __init__(self, ln_usage, ln_definition, value, symbol=None):
         self.ln_usage = ln_usage
         self.ln_definition = ln_definition
         self.value = value
+        self.symbol = symbol
 
     def __str__(self):
         return f"{self.ln_usage} {self.ln_definition} {self.value}"
@@ -16,10 +31,87 @@ class SemanticToken:
         return f"{self.ln_usage} {self.ln_definition} {self.value}"
 
     def __eq__(self, obj):
-        return isinstance(obj, SemanticToken) and obj.value == self.value
+        if not isinstance(obj, SemanticToken):
+            return False
+        if obj.symbol is not None and self.symbol is not None:
+            return obj.symbol == self.symbol
+        return obj.value == self.value
+
+
+class ScopeTable:
+    """
+    Visible variable definitions in nested scopes.
+
+    Every symbol id maps to the stack of its definitions (SemanticToken),
+    the innermost one last. Every scope keeps an undo log of symbols
+    defined in it, leaving the scope pops exactly those definitions.
+    Lookup, define, enter and exit are O(1) amortized.
+
+    The global scope is always there, size counts live definitions
+    and entered scopes.
+    """
+
+    def __init__(self):
+        self.definitions = dict()
+        self.scopes = [list()]
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return repr({symbol: stack[-1] for symbol, stack in self.definitions.items()})
+
+    def lookup(self, symbol):
+        """ Innermost definition of symbol or None """
+        stack = self.definitions.get(symbol)
+        return stack[-1] if stack is not None else None
+
+    def define(self, symbol, token):
+        """ Define symbol in the current scope, shadowing outer definitions """
+        stack = self.definitions.get(symbol)
+        if stack is None:
+            self.definitions[symbol] = [token]
+        else:
+            stack.append(token)
+        self.scopes[-1].append(symbol)
+        self.size += 1
+
+    def enter(self):
+        self.scopes.append(list())
+        self.size += 1
+
+    def exit(self):
+        """ Drop all definitions of the current scope """
+        undo = self.scopes.pop()
+        definitions = self.definitions
+        for symbol in undo:
+            stack = definitions[symbol]
+            stack.pop()
+            if len(stack) == 0:
+                del definitions[symbol]
+        self.size -= len(undo) + 1
+
+    def global_definitions(self):
+        return len(self.scopes[0])
+
+    def truncate(self, count):
+        """ Exit all scopes but the global one and keep its first count definitions """
+        while len(self.scopes) > 1:
+            self.exit()
+        undo = self.scopes[0]
+        definitions = self.definitions
+        for symbol in undo[count:]:
+            stack = definitions[symbol]
+            stack.pop()
+            if len(stack) == 0:
+                del definitions[symbol]
+        self.size -= len(undo) - count
+        del undo[count:]
 
 
 class Keywords:
+    OPERATIONS_LIST = "<lista_naredbi>"
     OPERATION_LOOP = "<za_petlja>"
     OPERATION_ASSIGN = "<naredba_pridruzivanja>"
 
@@ -52,7 +144,9 @@ class Semantic:
     """
     Semantic analysis for language 'PJ'.
 
-    Definition (declaration) of variables is saved on context stack.
+    Definition (declaration) of variables is saved in a scope table
+    (see <class ScopeTable>). Names are interned in a symbol table,
+    definitions are looked up by their symbol ids.
 
     There are two types of scopes:
         - global scope
@@ -63,7 +157,7 @@ class Semantic:
         - using variable out of scope
 
     Input:
-        AST as string from Parser
+        AST as string from Parser, or its lines without indentation
 
     Output:
         List of semantic tokens
@@ -73,38 +167,43 @@ class Semantic:
             - IDN - variable name
     """
 
-    def __init__(self, ast_str=None, debug_flag=False):
+    def __init__(self, ast_str=None, debug_flag=False, symbols=None, stats=None,
+                 ast_lines=None):
         self.semantic_tokens = list()
         self.ast_str = ast_str
         self.debug_flag = debug_flag
-        self.context_stack = list()
-        self.ast_lines = None
+        self.stats = stats
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.scopes = ScopeTable()
+        self.ast_lines = ast_lines
         self.cursor_index = -1
         self.cursor = None
         self.init_analyser()
 
     def init_analyser(self):
-        self.ast_lines = list()
-        for line in self.ast_str.split("\n"):
-            line = line.strip()
-            self.ast_lines.append(line)
+        if self.ast_lines is None:
+            self.ast_lines = list()
+            for line in self.ast_str.split("\n"):
+                line = line.strip()
+                self.ast_lines.append(line)
         if len(self.ast_lines) > 0:
             self.cursor_index = 0
             self.cursor = self.ast_lines[self.cursor_index]
 
     def advance(self):
-        self.debug(f"advancing from: {self.cursor_index} - {self.cursor}")
+        self.debug("advancing from: {} - {}", self.cursor_index, self.cursor)
         if self.cursor_index + 1 < len(self.ast_lines):
             self.cursor_index += 1
             self.cursor = self.ast_lines[self.cursor_index]
         else:
             self.cursor_index = -1
             self.cursor = None
-        self.debug(f"advanced to: {self.cursor_index} - {self.cursor}")
+        self.debug("advanced to: {} - {}", self.cursor_index, self.cursor)
 
-    def debug(self, msg):
+    def debug(self, msg, *args):
+        """ Print debug message, formatted only when it is printed """
         if self.debug_flag:
-            print("DEBUG: {}".format(str(msg)))
+            print("DEBUG: {}".format(str(msg).format(*args)))
         else:
             pass
 
@@ -120,71 +219,75 @@ class Semantic:
         Create semantic token object from current cursor line string.
         Save as semantic token attributes:
             - line in which variable is used
-            - line in which variable was defined (read from context stack)
+            - line in which variable was defined (read from scope table)
             - name of the variable
 
         If undeclared variable is being used, raise exception.
         """
-        self.debug(f"adding IDN {self.cursor}")
-        self.debug(f"tokens before push: {self.semantic_tokens}")
+        self.debug("adding IDN {}", self.cursor)
         line_items = self.cursor.strip().split(" ")
-        ln_usage = line_items[1]
-        idn_value = line_items[2]
-        ln_definition = self.find_definition_line_on_stack(idn_value)
+        self.use_variable(line_items[1], line_items[2], self.symbols.intern(line_items[2]))
+        self.advance()
+
+    def use_variable(self, ln_usage, idn_value, symbol):
+        self.debug("tokens before push: {}", self.semantic_tokens)
+        ln_definition = self.find_definition_line_on_stack(symbol)
         if ln_definition is not None and ln_definition != ln_usage:
-            token = SemanticToken(ln_usage, ln_definition, idn_value)
+            token = SemanticToken(ln_usage, ln_definition, idn_value, symbol)
             self.semantic_tokens.append(token)
         else:
-            token = SemanticToken(ln_usage, ln_usage, idn_value)
+            token = SemanticToken(ln_usage, ln_usage, idn_value, symbol)
             raise SemanticException(token)
-        self.advance()
-        self.debug(f"tokens after push: {self.semantic_tokens}")
+        self.debug("tokens after push: {}", self.semantic_tokens)
 
     def push_to_stack(self):
         """
         Create token object from current cursor line
-        and push it to stack.
+        and define it in the current scope.
         """
-        self.debug(f"stack before push: {self.context_stack}")
         line_items = self.cursor.strip().split(" ")
-        token = SemanticToken(line_items[1], line_items[1], line_items[2])
-        self.context_stack.append(token)
-        self.debug(f"stack after push: {self.context_stack}")
+        self.push_definition(line_items[1], line_items[2], self.symbols.intern(line_items[2]))
 
-    def pop_from_stack(self):
-        """
-        Remove the latest added token object from stack.
-        """
-        self.debug(f"stack before pop: {self.context_stack}")
-        popped = self.context_stack.pop()
-        self.debug(f"stack after pop: {self.context_stack}")
-        return popped
+    def push_definition(self, ln_definition, value, symbol):
+        self.debug("scopes before push: {}", self.scopes)
+        token = SemanticToken(ln_definition, ln_definition, value, symbol)
+        self.scopes.define(symbol, token)
+        if self.stats is not None:
+            self.stats.maximum("max_scope_depth", len(self.scopes))
+        self.debug("scopes after push: {}", self.scopes)
+
+    def enter_scope(self):
+        self.scopes.enter()
+        if self.stats is not None:
+            self.stats.maximum("max_scope_depth", len(self.scopes))
 
     def remove_block_scope_from_stack(self):
         """
         Remove all variables definied in the loop scope.
 
-        Variables in loop scope are all variables saved
-        on stack between KR_ZA and KR_AZ loop keywords.
+        Variables in loop scope are all variables defined
+        between KR_ZA and KR_AZ loop keywords.
         """
-        self.debug(f"loop finished - removing scope {self.cursor}")
-        while len(self.context_stack) > 0 and \
-                self.context_stack[-1].value != Keywords.KR_ZA_VALUE:
-            self.pop_from_stack()
-        self.pop_from_stack()
+        self.debug("loop finished - removing scope {}", self.cursor)
+        self.exit_scope()
         self.advance()
 
-    def find_definition_line_on_stack(self, idn_value):
+    def exit_scope(self):
+        self.debug("scopes before exit: {}", self.scopes)
+        self.scopes.exit()
+        self.debug("scopes after exit: {}", self.scopes)
+
+    def find_definition_line_on_stack(self, symbol):
         """
         Check if variable being used is defined.
-        (saved on context stack)
+        (visible in scope table)
         Return line of definition required to create SemanticToken object
         """
-        self.debug("trying to find on stack: " + str(idn_value))
-        for item in self.context_stack[::-1]:
-            if item.value == idn_value:
-                return item.ln_definition
-        return None
+        self.debug("trying to find in scopes: symbol {}", symbol)
+        if self.stats is not None:
+            self.stats.count("semantic_lookups")
+        definition = self.scopes.lookup(symbol)
+        return definition.ln_definition if definition is not None else None
 
     def analyse(self):
         while self.cursor is not None:
@@ -201,54 +304,276 @@ class Semantic:
 
     def operation_compound(self):
         """
-        Save variable (IDN) definition to context stack.
+        Save variable (IDN) definition to scope table.
 
         NOTE:
         If a variable is already defined in the same scope,
-        (token already pushed to stack) -
+        (or in an enclosing one) -
         don't rewrite it - keep the original declaration.
         """
-        self.debug("assign op: " + self.cursor)
+        self.debug("assign op: {}", self.cursor)
         self.advance()
         line_items = self.cursor.strip().split(" ")
-        token = SemanticToken(line_items[1], line_items[1], line_items[2])
-        token_on_stack = False
-        for item in self.context_stack[::-1]:
-            if item == token:
-                token_on_stack = True
-                break
-        if not token_on_stack:
-            self.push_to_stack()
+        self.define_variable(line_items[1], line_items[2], self.symbols.intern(line_items[2]))
         self.advance()
 
+    def define_variable(self, ln_definition, value, symbol):
+        if self.stats is not None:
+            self.stats.count("semantic_lookups")
+        if self.scopes.lookup(symbol) is None:
+            self.push_definition(ln_definition, value, symbol)
+
     def operation_loop(self):
         """
-        Save new scope to stack (KR_ZA)
-        and the following scope variable.
+        Enter new scope (KR_ZA)
+        and define the following scope variable in it.
         """
-        self.debug("loop op: " + self.cursor)
+        self.debug("loop op: {}", self.cursor)
         self.advance()
-        self.push_to_stack()
+        self.enter_scope()
         self.advance()
         self.push_to_stack()
         self.advance()
 
 
-def main():
-    parser_output = sys.stdin.read()
+class TreeSemantic(Semantic):
+    """
+    Semantic analysis for language 'PJ' walking the AST objects
+    of the syntax analyzer (<class AST> of SintaksniAnalizator).
+
+    Same semantic tokens and errors as <class Semantic>, but nodes
+    and tokens are visited in preorder with an explicit stack instead
+    of reading and splitting the lines of the printed tree.
+    Only node names, node children and token attributes are used,
+    definitions are looked up by the symbol ids the IDN tokens carry
+    (interned in symbols by the lexer), names are not hashed again.
+    """
+
+    def __init__(self, ast_root, debug_flag=False, symbols=None, stats=None):
+        super().__init__(debug_flag=debug_flag, symbols=symbols, stats=stats, ast_lines=[])
+        self.ast_root = ast_root
+
+    def analyse(self):
+        stack = [self.ast_root]
+
+        while len(stack) > 0:
+            item = stack.pop()
 
-    s = Semantic(parser_output, False)
+            if item is None:
+                continue
+
+            children = getattr(item, "node_children", None)
+            if children is not None:
+                self.debug("visiting: {}", item.node_name)
+                start = 0
+
+                if item.node_name == Keywords.OPERATION_ASSIGN:
+                    target = children[0]
+                    self.define_variable(target.line_number, target.value, target.symbol)
+                    start = 1
+                elif item.node_name == Keywords.OPERATION_LOOP:
+                    variable = children[1]
+                    self.enter_scope()
+                    self.push_definition(variable.line_number, variable.value, variable.symbol)
+                    start = 2
+
+                for i in range(len(children) - 1, start - 1, -1):
+                    stack.append(children[i])
+
+            elif item.identifier == Keywords.IDN:
+                self.use_variable(item.line_number, item.value, item.symbol)
+            elif item.identifier == Keywords.KR_AZ:
+                self.debug("loop finished - removing scope {}", item)
+                self.exit_scope()
+
+
+class IncrementalSemantic(TreeSemantic):
+    """
+    Tree-walking semantic analysis resuming after edits.
+
+    The statements of the program hang on a chain of <lista_naredbi>
+    nodes. At every node of the chain a run records a checkpoint: the
+    number of semantic tokens and of global definitions before it.
+
+    After editing the tree call edited() with the changed token or the
+    node whose children changed. The next analyse() goes back to the
+    checkpoint of the first top-level statement an edit touched, drops
+    the later tokens and global definitions and walks from there to the
+    end of the program.
+
+    Loops on the way are reused. A loop leaves the definitions of the
+    enclosing scopes as they were, so its semantic tokens depend only on
+    its lines and the definitions visible at its start of the names used
+    in it. For every analysed <za_petlja> node the cache keeps its line,
+    those names with the lines of their definitions (the snapshot) and
+    its semantic tokens. A loop is walked again when it encloses an edit,
+    moved to another line or one of its names resolves to another
+    definition. An example is a name an earlier edit defined or removed.
+    The result is the same as the result of a full run. Tokens put into
+    the tree carry their symbol ids, interned in symbols.
+    """
+
+    LOOP_END = "az"
+
+    def __init__(self, ast_root, debug_flag=False, symbols=None, stats=None):
+        super().__init__(ast_root, debug_flag, symbols, stats)
+        self.cache = dict()
+        self.parents = dict()
+        self.chain = list()
+        self.chain_index = dict()
+        self.checkpoints = list()
+        # first chain node to walk again, None when the results are up to date
+        self.dirty = 0
+
+    def edited(self, item):
+        """ Drop cached results of the loops enclosing an edited node or token """
+        while item is not None:
+            self.cache.pop(item, None)
+            index = self.chain_index.get(item)
+            if index is not None:
+                self.dirty = index if self.dirty is None else min(self.dirty, index)
+                return
+            item = self.parents.get(item)
+        self.dirty = 0
+
+    def definition_line(self, symbol):
+        definition = self.scopes.lookup(symbol)
+        return definition.ln_definition if definition is not None else None
+
+    def snapshot_matches(self, snapshot):
+        for symbol, ln_definition in snapshot:
+            if self.definition_line(symbol) != ln_definition:
+                return False
+        return True
+
+    def analyse(self):
+        index = self.dirty
+        if index is None:
+            return
+        if index > 0:
+            tokens, definitions = self.checkpoints[index]
+            stack = [self.chain[index]]
+            self.semantic_tokens = self.semantic_tokens[:tokens]
+            self.scopes.truncate(definitions)
+        else:
+            stack = [self.ast_root]
+            self.semantic_tokens = list()
+            self.scopes = ScopeTable()
+        for node in self.chain[index:]:
+            del self.chain_index[node]
+        del self.chain[index:]
+        del self.checkpoints[index:]
+
+        self.dirty = None
+        try:
+            self.walk(stack)
+        except SemanticException:
+            self.dirty = max(len(self.chain) - 1, 0)
+            raise
+
+    def walk(self, stack):
+        parents = self.parents
+        # open loops: [node, index of its first semantic token, names used in it]
+        loops = list()
+
+        while len(stack) > 0:
+            item = stack.pop()
+
+            if item is None:
+                continue
+
+            # all of the loop is analysed and its scope is left
+            if type(item) is tuple:
+                node, start, names = loops.pop()
+                snapshot = tuple((symbol, self.definition_line(symbol)) for symbol in names)
+                self.cache[node] = (node.node_children[0].line_number, snapshot,
+                                    self.semantic_tokens[start:])
+                if len(loops) > 0:
+                    loops[-1][2].update(names)
+                continue
+
+            children = getattr(item, "node_children", None)
+            if children is not None:
+                for child in children:
+                    if child is not None:
+                        parents[child] = item
+                start = 0
+
+                if item.node_name == Keywords.OPERATIONS_LIST and len(loops) == 0:
+                    self.chain_index[item] = len(self.chain)
+                    self.chain.append(item)
+                    self.checkpoints.append((len(self.semantic_tokens),
+                                             self.scopes.global_definitions()))
+                elif item.node_name == Keywords.OPERATION_ASSIGN:
+                    target = children[0]
+                    self.define_variable(target.line_number, target.value, target.symbol)
+                    if len(loops) > 0:
+                        loops[-1][2].add(target.symbol)
+                    start = 1
+                elif item.node_name == Keywords.OPERATION_LOOP:
+                    cached = self.cache.get(item)
+                    if cached is not None and cached[0] == children[0].line_number and \
+                            self.snapshot_matches(cached[1]):
+                        self.debug("reusing loop: {}", children[1])
+                        self.semantic_tokens.extend(cached[2])
+                        if len(loops) > 0:
+                            loops[-1][2].update(symbol for symbol, _ in cached[1])
+                        if self.stats is not None:
+                            self.stats.count("semantic_cache_hits")
+                        continue
+                    variable = children[1]
+                    loops.append([item, len(self.semantic_tokens), {variable.symbol}])
+                    stack.append((self.LOOP_END, item))
+                    self.enter_scope()
+                    self.push_definition(variable.line_number, variable.value, variable.symbol)
+                    start = 2
+
+                for i in range(len(children) - 1, start - 1, -1):
+                    stack.append(children[i])
+
+            elif item.identifier == Keywords.IDN:
+                self.use_variable(item.line_number, item.value, item.symbol)
+                if len(loops) > 0:
+                    loops[-1][2].add(item.symbol)
+            elif item.identifier == Keywords.KR_AZ:
+                self.debug("loop finished - removing scope {}", item)
+                self.exit_scope()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Semantic analyzer for language 'PJ'")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write phase timings and counters as JSON to stderr")
+    arg_parser.add_argument("--binary", metavar="PATH",
+                            help="read the AST in binary format from PATH instead of stdin")
+    args = arg_parser.parse_args()
+
+    stats = Stats() if args.stats else None
+
+    with stats.phase("read") if stats else nullcontext():
+        if args.binary is not None:
+            symbols = SymbolTable()
+            s = TreeSemantic(BinaryAST.load(args.binary, symbols), symbols=symbols, stats=stats)
+        else:
+            parser_output = sys.stdin.read()
+            s = Semantic(parser_output, False, stats=stats)
 
     try:
-        s.analyse()
+        with stats.phase("semantic") if stats else nullcontext():
+            s.analyse()
         for token in s.get_tokens():
             print(token)
     except SemanticException as e:
         for token in s.get_tokens():
             print(token)
         print(e)
+        if stats is not None:
+            stats.dump()
         exit(1)
 
+    if stats is not None:
+        stats.dump()
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,144 @@
+import io
+import os
+import unittest
+from contextlib import redirect_stdout
+
+# the analyzer puts the lexer and the syntax analyzer on sys.path
+from SemantickiAnalizator import IncrementalSemantic, Semantic, SemanticException, TreeSemantic
+from LeksickiAnalizator import CompactLexer, Stats, SymbolTable
+from SintaksniAnalizator import StackParser, Token
+
+
+def parse(source, symbols=None):
+    """ AST of a PJ source, identifiers interned in symbols """
+    lexer = CompactLexer(source, False, symbols)
+    lexer.analyze()
+    parser = StackParser(lexer.tokens, False, symbols)
+    parser.parse()
+    return parser.ast_root
+
+
+def text(tree):
+    """ AST as printed by the syntax analyzer """
+    stream = io.StringIO()
+    tree.write(stream)
+    return stream.getvalue()
+
+
+def run(analyzer):
+    """ Semantic tokens and error of an analysis as printed by main() """
+    try:
+        analyzer.analyse()
+        error = None
+    except SemanticException as e:
+        error = str(e)
+    return [str(token) for token in analyzer.get_tokens()], error
+
+
+class TreeSemanticTest(unittest.TestCase):
+
+    SOURCE = "n = 3\nza i od 1 do n\n x = i\n za j od x do n\n  y = j + x\n az\naz\nrez = x\n"
+
+    def test_without_shared_symbols(self):
+        # the lexer interns names in its own table, the analyzer gets a new one
+        tree = parse(self.SOURCE)
+        tokens, error = run(TreeSemantic(tree))
+        self.assertEqual((tokens, error), run(Semantic(text(tree))))
+        self.assertEqual(error, "err 8 x")
+
+    def test_debug_without_shared_symbols(self):
+        analyzer = TreeSemantic(parse("a = 1\nb = a\n"), debug_flag=True)
+        with open(os.devnull, "w") as null, redirect_stdout(null):
+            analyzer.analyse()
+        self.assertEqual([str(token) for token in analyzer.get_tokens()], ["2 1 a"])
+
+
+class IncrementalSemanticTest(unittest.TestCase):
+
+    def setUp(self):
+        self.symbols = SymbolTable()
+        self.stats = Stats()
+
+    def analyzed(self, source):
+        analyzer = IncrementalSemantic(parse(source, self.symbols), symbols=self.symbols,
+                                       stats=self.stats)
+        self.assertEqual(run(analyzer), run(TreeSemantic(analyzer.ast_root, symbols=self.symbols)))
+        return analyzer
+
+    def replace(self, analyzer, line, name, new_name):
+        """ Replace the IDN name at line with new_name and analyse again """
+        stack = [analyzer.ast_root]
+        while len(stack) > 0:
+            item = stack.pop()
+            children = getattr(item, "node_children", None)
+            if children is not None:
+                for index, child in enumerate(children):
+                    if getattr(child, "identifier", None) == "IDN" and \
+                            child.line_number == line and child.value == name:
+                        children[index] = Token("IDN", line, new_name,
+                                                self.symbols.intern(new_name))
+                        analyzer.edited(item)
+                        result = run(analyzer)
+                        self.assertEqual(result, run(TreeSemantic(analyzer.ast_root,
+                                                                  symbols=self.symbols)))
+                        return result
+                    stack.append(child)
+        self.fail(f"no IDN {name} at line {line}")
+
+    def test_edit_inside_cached_loop(self):
+        analyzer = self.analyzed("a = 1\nb = 2\ne = 3\nza i od 1 do a\n c = i + b\naz\n"
+                                 "za j od 1 do b\n d = j * a\naz\nrez = a\n")
+        # the first loop is before the edit, the second one is walked again
+        self.replace(analyzer, 8, "a", "b")
+        # analysis resumes after both loops
+        self.replace(analyzer, 10, "a", "b")
+        self.assertEqual(self.stats.counters.get("semantic_cache_hits", 0), 0)
+        # both loops follow the edit and are reused
+        self.replace(analyzer, 3, "e", "f")
+        self.assertEqual(self.stats.counters["semantic_cache_hits"], 2)
+        self.assertEqual(self.replace(analyzer, 1, "a", "x")[1], "err 4 a")
+
+    def test_edit_adding_a_definition(self):
+        analyzer = self.analyzed("a = 1\nx = 2\nza j od 1 do 3\n b = a + j\n c = b\naz\n"
+                                 "za k od 1 do 2\n d = a\naz\nrez = a\n")
+        # b in the loop now resolves to the global definition at line 2
+        tokens, error = self.replace(analyzer, 2, "x", "b")
+        self.assertIn("5 2 b", tokens)
+        self.assertIsNone(error)
+        self.assertEqual(self.stats.counters["semantic_cache_hits"], 1)
+        tokens, error = self.replace(analyzer, 2, "b", "x")
+        self.assertIn("5 4 b", tokens)
+
+    def test_edit_into_an_error_and_back(self):
+        analyzer = self.analyzed("a = 1\nza i od 1 do a\n za j od i do a\n  b = j\n az\naz\n"
+                                 "c = a\nrez = c\n")
+        self.assertEqual(self.replace(analyzer, 7, "a", "j")[1], "err 7 j")
+        # analysing again without edits gives the same error
+        self.assertEqual(run(analyzer)[1], "err 7 j")
+        tokens, error = self.replace(analyzer, 7, "j", "a")
+        self.assertIsNone(error)
+        self.assertEqual(tokens[-2:], ["7 1 a", "8 7 c"])
+
+    def test_edit_moving_a_loop(self):
+        analyzer = self.analyzed("a = 1\nza i od 1 do 3\n b = i\naz\nrez = a\n")
+        # put 'c = 5' in front, the tokens after it go one line down
+        root = analyzer.ast_root
+        stack = [root]
+        while len(stack) > 0:
+            children = stack.pop().node_children
+            for index, child in enumerate(children):
+                if hasattr(child, "node_children"):
+                    stack.append(child)
+                elif child is not None:
+                    children[index] = Token(child.identifier, child.line_number + 1,
+                                            child.value, child.symbol)
+        statements = parse("c = 5\n", self.symbols).node_children[0]
+        statements.node_children[1] = root.node_children[0]
+        root.node_children[0] = statements
+        analyzer.edited(root)
+        self.assertEqual(run(analyzer), run(TreeSemantic(root, symbols=self.symbols)))
+        self.assertEqual(run(analyzer)[0], ["4 3 i", "6 2 a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
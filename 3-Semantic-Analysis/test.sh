@@ -6,7 +6,7 @@ passed=0
 
 for t in $TEST_FOLDER/*;
 do
-    python3.8 SemantickiAnalizator.py < $t/Test.in > /tmp/Test.out
+    python3.8 SemantickiAnalizator.py $(cat $t/Test.args 2>/dev/null) < $t/Test.in > /tmp/Test.out
     diff -s $t/Test.out /tmp/Test.out
 
     if [[ $(diff -s $t/Test.out /tmp/Test.out ) == *"identical"* ]];
@@ -18,3 +18,4 @@ done
 total=$(find $TEST_FOLDER/* -type d | wc -l)
 echo -e "\nPassed: $passed \nTotal : $total"
 
+python3.8 -m unittest -q TestSemantickiAnalizator
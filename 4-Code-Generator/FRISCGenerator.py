@@ -0,0 +1,2018 @@
+import argparse
+import bisect
+import os
+import sys
+from contextlib import nullcontext
+
+LEXER_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                os.pardir, "1-Lexical-Analysis"))
+if LEXER_DIRECTORY not in sys.path:
+    sys.path.insert(0, LEXER_DIRECTORY)
+
+from LeksickiAnalizator import Stats, SymbolTable  # noqa: E402
+
+
+class Keywords:
+    PROGRAM = "<program>"
+    OPERATIONS_LIST = "<lista_naredbi>"
+    OPERATION_ASSIGN = "<naredba_pridruzivanja>"
+    OPERATION_LOOP = "<za_petlja>"
+    EXPRESSION = "<E>"
+    TERM = "<T>"
+    PRIMARY = "<P>"
+
+    IDN = "IDN"
+    BROJ = "BROJ"
+    OP_PLUS = "OP_PLUS"
+    OP_MINUS = "OP_MINUS"
+    OP_PUTA = "OP_PUTA"
+    OP_DIJELI = "OP_DIJELI"
+    L_ZAGRADA = "L_ZAGRADA"
+    EPSILON = "$"
+
+    RESULT = "rez"
+
+
+class Token:
+    """ Token data class """
+
+    __slots__ = ("identifier", "line_number", "value", "symbol")
+
+    def __init__(self, identifier, line_number, value, symbol=None):
+        self.identifier = identifier
+        self.line_number = line_number
+        self.value = value
+        self.symbol = symbol
+
+    def __repr__(self):
+        return "{} {} {}".format(self.identifier,
+                                 self.line_number, self.value)
+
+
+class Node:
+    """
+    Node of the generative tree, same attributes as <class AST>
+    of the syntax analyzer, $ children are None
+    """
+
+    __slots__ = ("node_name", "node_children")
+
+    def __init__(self, node_name, node_children=None):
+        self.node_name = node_name
+        self.node_children = node_children if node_children is not None else []
+
+    def __repr__(self):
+        return self.node_name
+
+
+def load_tree(text, symbols=None):
+    """
+    Build the tree from the text format of the syntax analyzer
+    (one node or token per line, indented by one space per level),
+    names of IDN tokens are interned in symbols
+    """
+    symbols = symbols if symbols is not None else SymbolTable()
+    root = None
+    # (indentation, node) of the open ancestors
+    stack = []
+
+    for line in text.split("\n"):
+        stripped = line.lstrip(" ")
+        if len(stripped) == 0:
+            continue
+        depth = len(line) - len(stripped)
+        stripped = stripped.rstrip()
+
+        if stripped.startswith("<"):
+            item = Node(stripped)
+        elif stripped == Keywords.EPSILON:
+            item = None
+        else:
+            identifier, line_number, value = stripped.split(" ")
+            symbol = symbols.intern(value) if identifier == Keywords.IDN else None
+            item = Token(identifier, int(line_number), value, symbol)
+
+        while len(stack) > 0 and stack[-1][0] >= depth:
+            stack.pop()
+        if len(stack) == 0:
+            root = item
+        else:
+            stack[-1][1].node_children.append(item)
+        if isinstance(item, Node):
+            stack.append((depth, item))
+
+    return root
+
+
+def wrap(value):
+    """ Value as 32-bit two's complement integer """
+    value &= 0xFFFFFFFF
+    return value - 0x100000000 if value & 0x80000000 else value
+
+
+def divide(a, b):
+    """ Integer division truncating towards zero, None for b == 0 """
+    if b == 0:
+        return None
+    quotient = abs(a) // abs(b)
+    return wrap(-quotient if (a < 0) != (b < 0) else quotient)
+
+
+def trips(start, bound):
+    """ Iterations of a loop from start to bound, at least one """
+    return wrap(max(bound - start, 0) + 1)
+
+
+def pairs(start, bound):
+    """ 0 + 1 + ... + (trips - 1), the sum of the offsets of the loop variable """
+    difference = max(bound - start, 0)
+    return wrap(difference * (difference + 1) // 2)
+
+
+class Variable:
+    """ Memory slot of one variable definition """
+
+    __slots__ = ("name", "line", "index")
+
+    def __init__(self, name, line, index):
+        self.name = name
+        self.line = line
+        self.index = index
+
+    def __repr__(self):
+        return "{}.{}".format(self.name, self.index)
+
+
+class Temp:
+    """ Intermediate result of an expression """
+
+    __slots__ = ("index",)
+
+    def __init__(self, index):
+        self.index = index
+
+    def __repr__(self):
+        return "t{}".format(self.index)
+
+
+class Instruction:
+    """
+    Three-address instruction: dest = a op b
+
+    Operations are copy and neg (b is None), add, sub, mul, div and
+    trips and pairs of a loop from a to b (see the functions).
+    Operands are <class Variable>, <class Temp> or int constants.
+    """
+
+    __slots__ = ("op", "dest", "a", "b")
+
+    OPERATORS = {"add": "+", "sub": "-", "mul": "*", "div": "/"}
+
+    def __init__(self, op, dest, a, b=None):
+        self.op = op
+        self.dest = dest
+        self.a = a
+        self.b = b
+
+    def operands(self):
+        return (self.a,) if self.b is None else (self.a, self.b)
+
+    def __repr__(self):
+        if self.op == "copy":
+            return "{} = {}".format(self.dest, self.a)
+        if self.op == "neg":
+            return "{} = -{}".format(self.dest, self.a)
+        if self.op in ("trips", "pairs"):
+            return "{} = {}({}, {})".format(self.dest, self.op, self.a, self.b)
+        return "{} = {} {} {}".format(self.dest, self.a, self.OPERATORS[self.op], self.b)
+
+
+class Loop:
+    """
+    'za' loop of the IR. The loop variable gets its start value before
+    the loop, then it runs like the loops of the lab instructions:
+
+        do {
+            body
+            latch (var = var + 1 and the code of the 'do' expression)
+        } while (var <= bound)
+
+    Body holds instructions and nested loops, latch only instructions.
+    """
+
+    __slots__ = ("var", "body", "latch", "bound")
+
+    def __init__(self, var, body, latch, bound):
+        self.var = var
+        self.body = body
+        self.latch = latch
+        self.bound = bound
+
+
+def walk_instructions(items):
+    """ All instructions of IR items, nested loops included """
+    stack = [items]
+    while len(stack) > 0:
+        for item in stack.pop():
+            if isinstance(item, Loop):
+                stack.append(item.body)
+                stack.append(item.latch)
+            else:
+                yield item
+
+
+def format_ir(items, margin=0):
+    """ Lines of IR items for reading """
+    lines = []
+    for item in items:
+        if isinstance(item, Loop):
+            lines.append(" " * margin + "loop {}:".format(item.var))
+            lines += format_ir(item.body, margin + 4)
+            lines.append(" " * margin + "latch:")
+            lines += format_ir(item.latch, margin + 4)
+            lines.append(" " * margin + "while {} <= {}".format(item.var, item.bound))
+        else:
+            lines.append(" " * margin + repr(item))
+    return lines
+
+
+class Program:
+    """ IR of a whole program: items, all variables and the result variable """
+
+    def __init__(self):
+        self.items = list()
+        self.variables = list()
+        self.temps = 0
+        self.result = None
+        self.shifts = False
+        self.registers = False
+
+    def variable(self, name, line):
+        variable = Variable(name, line, len(self.variables))
+        self.variables.append(variable)
+        return variable
+
+    def temp(self):
+        self.temps += 1
+        return Temp(self.temps - 1)
+
+    def instruction_count(self):
+        return sum(1 for _ in walk_instructions(self.items))
+
+    def __repr__(self):
+        return "\n".join(format_ir(self.items))
+
+
+class Lowering:
+    """
+    Lowers the generative tree to three-address IR.
+
+    Names are resolved as in the semantic analysis: the left side of an
+    assignment is resolved (or defined in the current scope) before its
+    right side, a loop opens a scope with its own loop variable before
+    its 'od' and 'do' expressions. Definitions are looked up by the
+    symbol ids the IDN tokens carry. Operators are left associative,
+    although the grammar nests <E_lista> and <T_lista> to the right.
+    """
+
+    def __init__(self):
+        self.program = Program()
+        self.definitions = dict()
+        self.scopes = [list()]
+
+    def lookup(self, symbol):
+        stack = self.definitions.get(symbol)
+        return stack[-1] if stack is not None else None
+
+    def define(self, token):
+        variable = self.program.variable(token.value, token.line_number)
+        self.definitions.setdefault(token.symbol, []).append(variable)
+        self.scopes[-1].append(token.symbol)
+        if len(self.scopes) == 1 and token.value == Keywords.RESULT:
+            self.program.result = variable
+        return variable
+
+    def exit_scope(self):
+        for symbol in self.scopes.pop():
+            stack = self.definitions[symbol]
+            stack.pop()
+            if len(stack) == 0:
+                del self.definitions[symbol]
+
+    def lower(self, root):
+        """ Lower the tree under root to <class Program> """
+        self.lower_statements(root.node_children[0], self.program.items)
+        return self.program
+
+    def lower_statements(self, statements, code):
+        """ Lower a <lista_naredbi> chain into the list code """
+        while statements is not None and len(statements.node_children) == 2:
+            statement = statements.node_children[0].node_children[0]
+            if statement.node_name == Keywords.OPERATION_ASSIGN:
+                self.lower_assignment(statement, code)
+            else:
+                self.lower_loop(statement, code)
+            statements = statements.node_children[1]
+
+    def lower_assignment(self, statement, code):
+        target, _, expression = statement.node_children
+        variable = self.lookup(target.symbol)
+        if variable is None:
+            variable = self.define(target)
+        value = self.lower_expression(expression, code)
+        code.append(Instruction("copy", variable, value))
+
+    def lower_loop(self, statement, code):
+        children = statement.node_children
+        self.scopes.append(list())
+        variable = self.define(children[1])
+
+        start = self.lower_expression(children[3], code)
+        code.append(Instruction("copy", variable, start))
+
+        bound_code = list()
+        bound = self.lower_expression(children[5], bound_code)
+
+        body = list()
+        self.lower_statements(children[6], body)
+        self.exit_scope()
+
+        latch = [Instruction("add", variable, variable, 1)] + bound_code
+        code.append(Loop(variable, body, latch, bound))
+
+    def lower_expression(self, expression, code):
+        """ <E> or <T>: operands joined by their list operators, left to right """
+        list_operators = {Keywords.OP_PLUS: "add", Keywords.OP_MINUS: "sub",
+                          Keywords.OP_PUTA: "mul", Keywords.OP_DIJELI: "div"}
+
+        operand, rest = expression.node_children
+        if expression.node_name == Keywords.EXPRESSION:
+            value = self.lower_expression(operand, code)
+        else:
+            value = self.lower_primary(operand, code)
+
+        # <E_lista> ::= OP <E> | $, <T_lista> ::= OP <T> | $
+        while rest is not None and rest.node_children[0] is not None:
+            operator, chain = rest.node_children
+            operand, rest = chain.node_children
+            if chain.node_name == Keywords.EXPRESSION:
+                right = self.lower_expression(operand, code)
+            else:
+                right = self.lower_primary(operand, code)
+            result = self.program.temp()
+            code.append(Instruction(list_operators[operator.identifier], result, value, right))
+            value = result
+
+        return value
+
+    def lower_primary(self, primary, code):
+        """ <P>: constant, variable, parenthesised expression or unary sign """
+        negate = False
+        children = primary.node_children
+        while children[0].identifier in (Keywords.OP_PLUS, Keywords.OP_MINUS):
+            if children[0].identifier == Keywords.OP_MINUS:
+                negate = not negate
+            children = children[1].node_children
+
+        first = children[0]
+        if first.identifier == Keywords.BROJ:
+            value = wrap(int(first.value))
+        elif first.identifier == Keywords.IDN:
+            value = self.lookup(first.symbol)
+        else:
+            value = self.lower_expression(children[1], code)
+
+        if negate:
+            result = self.program.temp()
+            code.append(Instruction("neg", result, value))
+            value = result
+        return value
+
+
+def fold(instruction):
+    """
+    Fold an instruction with constant operands (or an identity
+    such as x + 0) into a copy, return True if it changed
+    """
+    op, a, b = instruction.op, instruction.a, instruction.b
+    value = None
+
+    if op == "copy":
+        return False
+    elif op == "neg":
+        if isinstance(a, int):
+            value = wrap(-a)
+    elif isinstance(a, int) and isinstance(b, int):
+        if op == "add":
+            value = wrap(a + b)
+        elif op == "sub":
+            value = wrap(a - b)
+        elif op == "mul":
+            value = wrap(a * b)
+        elif op == "div":
+            value = divide(a, b)
+        else:
+            value = trips(a, b) if op == "trips" else pairs(a, b)
+    elif (op == "add" and b == 0) or (op == "sub" and b == 0) or \
+            (op in ("mul", "div") and b == 1):
+        value = a
+    elif op in ("add", "mul") and a == (0 if op == "add" else 1):
+        value = b
+    elif op == "mul" and (a == 0 or b == 0):
+        value = 0
+
+    if value is None:
+        return False
+    instruction.op, instruction.a, instruction.b = "copy", value, None
+    return True
+
+
+def assigned_in(items):
+    """ Variables and temps assigned anywhere in IR items """
+    return {instruction.dest for instruction in walk_instructions(items)}
+
+
+def is_increment(instruction, variable):
+    return instruction.op == "add" and instruction.dest is variable and \
+        instruction.a is variable and instruction.b == 1
+
+
+def transform_loops(items, transform):
+    """
+    Call transform on every loop of items, innermost first. It returns
+    instructions to run before the loop and the items replacing the loop.
+    """
+    index = 0
+    while index < len(items):
+        item = items[index]
+        if isinstance(item, Loop):
+            transform_loops(item.body, transform)
+            before, replacement = transform(item)
+            items[index:index + 1] = before + replacement
+            index += len(before) + len(replacement)
+        else:
+            index += 1
+
+
+class ConstantFolding:
+    """ Fold instructions whose operands are constants """
+
+    name = "fold"
+
+    def run(self, program):
+        for instruction in walk_instructions(program.items):
+            fold(instruction)
+
+
+class ConstantPropagation:
+    """
+    Replace uses of variables and temps holding a known constant.
+
+    Straight-line code keeps a map of known values. Values assigned
+    anywhere in a loop are unknown in the whole loop and after it,
+    other values are carried through. Replaced instructions are folded.
+    """
+
+    name = "propagate"
+
+    def run(self, program):
+        self.propagate(program.items, dict())
+
+    def propagate(self, items, known):
+        for item in items:
+            if isinstance(item, Loop):
+                assigned = assigned_in([item])
+                for dest in assigned:
+                    known.pop(dest, None)
+                inner = dict(known)
+                self.propagate(item.body, inner)
+                self.propagate(item.latch, inner)
+                if not isinstance(item.bound, int) and item.bound in inner:
+                    item.bound = inner[item.bound]
+                continue
+
+            if not isinstance(item.a, int) and item.a in known:
+                item.a = known[item.a]
+            if item.b is not None and not isinstance(item.b, int) and item.b in known:
+                item.b = known[item.b]
+            fold(item)
+            if item.op == "copy" and isinstance(item.a, int):
+                known[item.dest] = item.a
+            else:
+                known.pop(item.dest, None)
+
+
+class CommonSubexpressions:
+    """
+    Reuse values computed earlier in the same straight-line code.
+
+    An operation with the same operands as an available one becomes
+    a copy of its result. Assigning a variable makes every expression
+    using it (or kept in it) unavailable, loops start and end with
+    nothing available.
+    """
+
+    name = "cse"
+    COMMUTATIVE = ("add", "mul")
+
+    def run(self, program):
+        self.eliminate(program.items)
+
+    def eliminate(self, items):
+        available = dict()
+        for item in items:
+            if isinstance(item, Loop):
+                self.eliminate(item.body)
+                self.eliminate(item.latch)
+                available = dict()
+                continue
+
+            if item.op != "copy":
+                key = (item.op, item.a, item.b)
+                holder = available.get(key)
+                if holder is None and item.op in self.COMMUTATIVE:
+                    holder = available.get((item.op, item.b, item.a))
+                if holder is not None:
+                    item.op, item.a, item.b = "copy", holder, None
+
+            dest = item.dest
+            for key in [key for key, holder in available.items()
+                        if holder is dest or key[1] is dest or key[2] is dest]:
+                del available[key]
+
+            if item.op != "copy" and item.a is not dest and item.b is not dest:
+                available[(item.op, item.a, item.b)] = dest
+
+
+class DeadStores:
+    """
+    Remove assignments whose value is never read.
+
+    Liveness is computed backwards, the result variable is live at the
+    end. A loop body runs at least once and may run again, so values
+    live at its end are those live after the loop, at its start and
+    in its condition, iterated until nothing changes.
+    """
+
+    name = "dse"
+
+    def run(self, program):
+        live = set() if program.result is None else {program.result}
+        self.live_in(program.items, live, remove=True)
+
+    def live_in(self, items, live, remove):
+        """ Update live (after items) to the values live before items """
+        keep = list()
+        for item in reversed(items):
+            if isinstance(item, Loop):
+                after = set(live)
+                start = set()
+                while True:
+                    check = after | start | {item.var}
+                    if not isinstance(item.bound, int):
+                        check.add(item.bound)
+                    new_start = set(check)
+                    self.live_in(item.latch, new_start, remove=False)
+                    self.live_in(item.body, new_start, remove=False)
+                    if new_start == start:
+                        break
+                    start = new_start
+                self.live_in(item.latch, check, remove)
+                self.live_in(item.body, check, remove)
+                live.clear()
+                live |= start
+                keep.append(item)
+                continue
+
+            if item.dest not in live and remove:
+                continue
+            live.discard(item.dest)
+            for operand in item.operands():
+                if not isinstance(operand, int):
+                    live.add(operand)
+            keep.append(item)
+
+        if remove:
+            items[:] = reversed(keep)
+
+
+class LoopInvariants:
+    """
+    Hoist loop-invariant computations in front of their loop.
+
+    An instruction is hoisted when it assigns a temp from constants and
+    values not assigned in the loop (or hoisted already), the code of the
+    bound included. A loop body always runs, so hoisting never computes
+    anything the loop would not.
+    """
+
+    name = "licm"
+
+    def run(self, program):
+        transform_loops(program.items, self.hoist)
+
+    @staticmethod
+    def hoist(loop):
+        changed = assigned_in([loop])
+        hoisted = list()
+        for code in (loop.body, loop.latch):
+            keep = list()
+            for item in code:
+                if isinstance(item, Instruction) and isinstance(item.dest, Temp) and \
+                        all(isinstance(operand, int) or operand not in changed
+                            for operand in item.operands()):
+                    hoisted.append(item)
+                    changed.discard(item.dest)
+                else:
+                    keep.append(item)
+            code[:] = keep
+        return hoisted, [loop]
+
+
+class StrengthReduction:
+    """
+    Replace multiplications of the loop variable by an invariant with
+    running products.
+
+    For every invariant factor a new variable starts as var * factor in
+    front of the loop and grows by the factor right after the increment,
+    so it equals var * factor in the body and in the bound. Needs a loop
+    variable changed only by its increment. Sums wrap as the products do.
+    """
+
+    name = "strength"
+
+    def run(self, program):
+        self.program = program
+        transform_loops(program.items, self.reduce)
+
+    def reduce(self, loop):
+        var = loop.var
+        if not is_increment(loop.latch[0], var) or \
+                var in assigned_in(loop.body) | assigned_in(loop.latch[1:]):
+            return [], [loop]
+
+        changed = assigned_in([loop])
+        running = dict()
+        before = list()
+        updates = list()
+        for code in (loop.body, loop.latch):
+            for item in code:
+                if isinstance(item, Loop) or item.op != "mul" or \
+                        (item.a is not var and item.b is not var):
+                    continue
+                factor = item.b if item.a is var else item.a
+                if factor is var or not isinstance(factor, int) and factor in changed:
+                    continue
+                product = running.get(factor)
+                if product is None:
+                    product = self.program.variable("{}*{}".format(var.name, factor), var.line)
+                    running[factor] = product
+                    before.append(Instruction("mul", product, var, factor))
+                    updates.append(Instruction("add", product, product, factor))
+                item.op, item.a, item.b = "copy", product, None
+
+        loop.latch[1:1] = updates
+        return before, [loop]
+
+
+class ClosedForms:
+    """
+    Replace loops of affine updates by their result.
+
+    A loop qualifies when its bound is invariant, its variable is only
+    incremented and every variable assigned in its body ends up as
+    either x + a * var + b (an accumulator) or a * var + b, a and b
+    invariant. With n = trips(var, bound) and p = pairs(var, bound):
+
+        x = x + n * b + a * (n * var + p)
+        x = a * (var + n - 1) + b
+
+    All of it is exact modulo 2^32. A loop up to 2^31 - 1 never ends
+    (its variable wraps), its closed form does.
+    """
+
+    name = "closed"
+
+    def run(self, program):
+        self.program = program
+        transform_loops(program.items, self.close)
+
+    def combine(self, code, op, a, b=None):
+        """ Operand holding a op b, computed by code appended to code """
+        instruction = Instruction(op, None, a, b)
+        if fold(instruction):
+            return instruction.a
+        instruction.dest = self.program.temp()
+        code.append(instruction)
+        return instruction.dest
+
+    def close(self, loop):
+        var = loop.var
+        changed = assigned_in([loop])
+        if len(loop.latch) != 1 or not is_increment(loop.latch[0], var) or \
+                var in assigned_in(loop.body) or \
+                any(isinstance(item, Loop) for item in loop.body) or \
+                not isinstance(loop.bound, int) and loop.bound in changed:
+            return [], [loop]
+
+        code = list()
+        # operand -> (accumulator or None, a, b) of its value acc + a * var + b
+        forms = dict()
+        assigned = list()
+
+        def form(operand):
+            if operand is var:
+                return None, 1, 0
+            if operand in forms:
+                return forms[operand]
+            if isinstance(operand, int) or operand not in changed:
+                return None, 0, operand
+            if isinstance(operand, Variable):
+                return operand, 0, 0
+            return None
+
+        for item in loop.body:
+            first = form(item.a)
+            second = form(item.b) if item.b is not None else (None, 0, 0)
+            if first is None or second is None:
+                return [], [loop]
+            (acc, a, b), (acc2, a2, b2) = first, second
+
+            if item.op == "copy":
+                result = first
+            elif item.op in ("add", "sub"):
+                if acc2 is not None and (acc is not None or item.op == "sub"):
+                    return [], [loop]
+                result = (acc or acc2, self.combine(code, item.op, a, a2),
+                          self.combine(code, item.op, b, b2))
+            elif item.op == "neg":
+                if acc is not None:
+                    return [], [loop]
+                result = (None, self.combine(code, "neg", a), self.combine(code, "neg", b))
+            elif acc is not None or acc2 is not None:
+                return [], [loop]
+            elif item.op == "mul" and (a == 0 or a2 == 0):
+                factor, a, b = (b, a2, b2) if a == 0 else (b2, a, b)
+                result = (None, self.combine(code, "mul", a, factor),
+                          self.combine(code, "mul", b, factor))
+            elif a == 0 and a2 == 0:
+                result = (None, 0, self.combine(code, item.op, b, b2))
+            else:
+                return [], [loop]
+
+            if isinstance(item.dest, Variable):
+                if result[0] not in (None, item.dest):
+                    return [], [loop]
+                if item.dest not in forms:
+                    assigned.append(item.dest)
+            forms[item.dest] = result
+
+        n = self.combine(code, "trips", var, loop.bound)
+        total = None
+        for variable in assigned:
+            acc, a, b = forms[variable]
+            if acc is not None:
+                if total is None and a != 0:
+                    p = self.combine(code, "pairs", var, loop.bound)
+                    total = self.combine(code, "add", self.combine(code, "mul", n, var), p)
+                value = self.combine(code, "add", variable, self.combine(code, "mul", n, b))
+                if a != 0:
+                    value = self.combine(code, "add", value, self.combine(code, "mul", a, total))
+            else:
+                last = self.combine(code, "sub", self.combine(code, "add", var, n), 1)
+                value = self.combine(code, "add", self.combine(code, "mul", a, last), b)
+            code.append(Instruction("copy", variable, value))
+        return code, []
+
+
+class ConstantShifts:
+    """
+    Multiply and divide by constants with shifts instead of the runtime.
+
+    The IR is not changed, the emitter picks the instructions: products
+    with at most four nonzero signed binary digits of the constant become
+    shifts and additions, quotients by powers of two arithmetic shifts
+    rounding toward zero.
+    """
+
+    name = "shifts"
+
+    def run(self, program):
+        program.shifts = True
+
+
+class RegisterAllocation:
+    """
+    Keep variables and temps in registers instead of memory words.
+
+    Live ranges are computed by the emitter on the final IR, after all
+    passes, see <class LinearScan>.
+    """
+
+    name = "registers"
+
+    def run(self, program):
+        program.registers = True
+
+
+class PassManager:
+    """
+    Runs optimization passes on the IR in the given order.
+
+    Every pass can be switched on or off by name. Passes compute values
+    at compile time, so none runs unless asked for: the lab instructions
+    forbid reducing the arithmetic of the graded programs.
+    """
+
+    PASSES = [ConstantFolding, ConstantPropagation, LoopInvariants, ClosedForms,
+              StrengthReduction, CommonSubexpressions, DeadStores, ConstantShifts,
+              RegisterAllocation]
+    DEFAULT = ["fold", "propagate", "licm", "closed", "strength", "cse", "dse", "shifts",
+               "registers"]
+
+    def __init__(self, names=(), stats=None):
+        passes = {optimization.name: optimization for optimization in self.PASSES}
+        unknown = [name for name in names if name not in passes]
+        if len(unknown) > 0:
+            raise ValueError("unknown passes: {}".format(", ".join(unknown)))
+        self.passes = [passes[name]() for name in names]
+        self.stats = stats
+
+    def run(self, program):
+        if self.stats is not None:
+            self.stats.count("ir_instructions", program.instruction_count())
+        for optimization in self.passes:
+            optimization.run(program)
+            if self.stats is not None:
+                self.stats.count("ir_instructions_after_" + optimization.name,
+                                 program.instruction_count())
+        return program
+
+
+class Interval:
+    """ Live range of a variable or temp, in positions of <class LinearScan> """
+
+    __slots__ = ("operand", "start", "end", "weight", "register")
+
+    def __init__(self, operand, start):
+        self.operand = operand
+        self.start = start
+        self.end = start
+        self.weight = 0
+        self.register = None
+
+    def __repr__(self):
+        return "{} [{}, {}] {}".format(self.operand, self.start, self.end,
+                                       self.register or "memory")
+
+
+class LinearScan:
+    """
+    Linear-scan register allocation of variables and temps.
+
+    Instructions are numbered in the order the emitter writes them, every
+    loop ending with the comparison of its variable. A live range runs
+    from the first to the last instruction using or assigning its value.
+    Loops run at least once and have no other branches, so a value read
+    in a loop before the loop assigns it, such as the loop variable or
+    rez in rez = rez + i, is the one of the previous iteration: its range
+    covers the whole loop. Names defined in a loop body are out of scope
+    after it, so their ranges end in the loop unless they are read that
+    way. A value read before any assignment is the 0 its memory word
+    would start with, its range starts at -1.
+
+    REGISTERS leave out R0 to R2, which the emitter uses as scratch in
+    every instruction, not only around calls: operands in memory are
+    loaded into R0 and R1 and results are made in R2 before they are
+    stored. The MUL and DIV routines, negation, loop comparisons and the
+    trips, pairs and shift sequences also work in them. R7 is the stack
+    pointer.
+
+    Ranges get REGISTERS in order of their start. When none is free, the
+    range with the lowest density goes to memory: its uses per position
+    it holds a register, both weighing LOOP_WEIGHT times more for each
+    loop around them. A long range used rarely gives way to temps, loop
+    variables and accumulators. Ranges across a call prefer registers
+    the routine does not change, calls(instruction) gives the registers
+    an instruction changes.
+    """
+
+    REGISTERS = ["R3", "R4", "R5", "R6"]
+    LOOP_WEIGHT = 8
+
+    def __init__(self, program, calls):
+        self.program = program
+        self.calls = calls
+        self.position = dict()
+        self.first = dict()
+        self.intervals = dict()
+        self.writes = dict()
+        self.around = list()
+        self.clobbers = list()
+        self.saves = dict()
+        self.weights = [0]
+        self.count = 0
+
+    def run(self):
+        """ Intervals of all operands with their registers, None for memory """
+        self.number(self.program.items, ())
+        self.weights.append(self.weights[-1] + 1)
+        if self.program.result is not None:
+            self.occur(self.program.result, False, ())
+        for interval, loop in self.around:
+            first, last = self.position[loop]
+            interval.start = min(interval.start, first)
+            interval.end = max(interval.end, last)
+
+        self.allocate(sorted(self.intervals.values(),
+                             key=lambda interval: (interval.start, interval.end)))
+        for interval in self.intervals.values():
+            for position, dest, changed in self.calls_in(interval):
+                if interval.register in changed:
+                    self.saves.setdefault(position, []).append(interval.register)
+        return self.intervals
+
+    def number(self, items, loops):
+        for item in items:
+            if isinstance(item, Loop):
+                inner = loops + (item,)
+                self.first[item] = self.count
+                self.number(item.body, inner)
+                self.number(item.latch, inner)
+                self.position[item] = (self.first[item], self.count)
+                self.occur(item.var, False, inner)
+                if not isinstance(item.bound, int):
+                    self.occur(item.bound, False, inner)
+                self.weights.append(self.weights[-1] + self.LOOP_WEIGHT ** len(inner))
+            else:
+                self.position[item] = self.count
+                for operand in item.operands():
+                    if not isinstance(operand, int):
+                        self.occur(operand, False, loops)
+                changed = self.calls(item)
+                if len(changed) > 0:
+                    self.clobbers.append((self.count, item.dest, set(changed)))
+                self.occur(item.dest, True, loops)
+                self.weights.append(self.weights[-1] + self.LOOP_WEIGHT ** len(loops))
+            self.count += 1
+
+    def density(self, interval):
+        """ Weight of the uses of interval per weighted position it covers """
+        return interval.weight / (self.weights[interval.end + 1] - self.weights[max(interval.start, 0)])
+
+    def occur(self, operand, write, loops):
+        interval = self.intervals.get(operand)
+        if interval is None:
+            interval = self.intervals[operand] = Interval(operand, self.count)
+        interval.end = self.count
+        interval.weight += self.LOOP_WEIGHT ** len(loops)
+
+        if write:
+            self.writes[operand] = self.count
+            return
+        # a read with no write since the start of a loop comes around its back edge
+        last = self.writes.get(operand)
+        if last is None:
+            interval.start = -1
+            self.around += [(interval, loop) for loop in loops]
+        else:
+            self.around += [(interval, loop) for loop in loops if self.first[loop] > last]
+
+    def calls_in(self, interval):
+        """ Calls the value of interval must survive: (position, dest, changed registers) """
+        index = bisect.bisect_left(self.clobbers, (interval.start,))
+        while index < len(self.clobbers) and self.clobbers[index][0] < interval.end:
+            if self.clobbers[index][1] is not interval.operand:
+                yield self.clobbers[index]
+            index += 1
+
+    def allocate(self, intervals):
+        free = list(self.REGISTERS)
+        active = list()
+        for interval in intervals:
+            for old in [old for old in active if old.end <= interval.start]:
+                active.remove(old)
+                free.append(old.register)
+
+            if len(free) == 0:
+                spilled = min(active + [interval],
+                              key=lambda candidate: (self.density(candidate), -candidate.end))
+                if spilled is interval:
+                    continue
+                active.remove(spilled)
+                free.append(spilled.register)
+                spilled.register = None
+
+            changed = set()
+            for _, _, registers in self.calls_in(interval):
+                changed |= registers
+            kept = [register for register in free if register not in changed]
+            interval.register = (kept or free)[0]
+            free.remove(interval.register)
+            active.append(interval)
+
+    def saved(self, instruction):
+        """ Registers to keep around the call of instruction """
+        return self.saves.get(self.position[instruction], [])
+
+
+class FriscInstruction:
+    """ One line of the FRISC program: label, operation, operands, comment """
+
+    __slots__ = ("label", "operation", "operands", "comment")
+
+    def __init__(self, operation, operands=(), label=None, comment=None):
+        self.label = label
+        self.operation = operation
+        self.operands = list(operands)
+        self.comment = comment
+
+    def __str__(self):
+        line = "{:<7} {}".format(self.label or "", self.operation)
+        if len(self.operands) > 0:
+            line += " " + ", ".join(self.operands)
+        if self.comment is not None:
+            line += " ; " + self.comment
+        return line.rstrip()
+
+
+def frisc_number(value):
+    """ Immediate operand: decimal, negative values as 20-bit two's complement """
+    if value >= 0:
+        return "%D {}".format(value)
+    return "0{:05X}".format(value & 0xFFFFF)
+
+
+def frisc_word(value):
+    """ 32-bit data word """
+    if value >= 0:
+        return "%D {}".format(value)
+    return "0{:08X}".format(value & 0xFFFFFFFF)
+
+
+def fits_immediate(value):
+    return -(1 << 19) <= value < (1 << 19)
+
+
+def is_power_of_two(value):
+    """ Whether value is a constant +-2^k """
+    return isinstance(value, int) and value != 0 and abs(value) & (abs(value) - 1) == 0
+
+
+def signed_digits(value):
+    """ Nonzero digits of the non-adjacent form of value as (digit, shift) """
+    digits = list()
+    shift = 0
+    while value != 0:
+        if value % 2 != 0:
+            digit = 2 - value % 4
+            digits.append((digit, shift))
+            value -= digit
+        value //= 2
+        shift += 1
+    return digits
+
+
+class Emitter:
+    """
+    Emits FRISC instructions for the IR.
+
+    Every variable and temp has a memory word, instructions load their
+    operands into R0 and R1 and store the result from R2. The stack
+    pointer R7 starts at 40000 (end of memory), the result variable is
+    loaded into R6 before HALT. Multiplication and division are runtime
+    routines taking R0 and R1 and returning R2, MUL changes R0 to R2 and
+    DIV R0 to R4 (see RUNTIME). With program.shifts, constant factors and
+    powers of two divisors are emitted inline as shifts. With
+    program.registers, operands allocated by <class LinearScan> live in
+    R3 to R6 and are used in place, R0 to R2 stay scratch registers.
+    """
+
+    STACK_TOP = "40000"
+
+    """ Runtime routines, added only when used """
+    RUNTIME = {
+        # shift and add over the bits of the smaller factor, negating both
+        # factors when both are negative; the low word needs no other signs
+        "MUL": [
+            ("MUL", "AND", ["R0", "R1", "R2"]),
+            (None, "MOVE", ["0", "R2"]),
+            (None, "JP_P", ["MUL_1"]),
+            (None, "SUB", ["R2", "R0", "R0"]),
+            (None, "SUB", ["R2", "R1", "R1"]),
+            ("MUL_1", "CMP", ["R0", "R1"]),
+            (None, "JP_UGE", ["MUL_2"]),
+            (None, "XOR", ["R0", "R1", "R0"]),
+            (None, "XOR", ["R0", "R1", "R1"]),
+            (None, "XOR", ["R0", "R1", "R0"]),
+            ("MUL_2", "OR", ["R1", "R1", "R1"]),
+            (None, "RET_Z", []),
+            ("MUL_3", "SHR", ["R1", "1", "R1"]),
+            (None, "JP_C", ["MUL_4"]),
+            (None, "SHL", ["R0", "1", "R0"]),
+            (None, "JP", ["MUL_3"]),
+            ("MUL_4", "ADD", ["R2", "R0", "R2"]),
+            (None, "SHL", ["R0", "1", "R0"]),
+            (None, "OR", ["R1", "R1", "R1"]),
+            (None, "JP_NZ", ["MUL_3"]),
+            (None, "RET", []),
+        ],
+        # divide the magnitudes: shift the divisor up to the dividend, then
+        # subtract it back down with a quotient bit per step; the quotient
+        # takes the sign of R3 and is 0 when dividing by 0
+        "DIV": [
+            ("DIV", "XOR", ["R0", "R1", "R3"]),
+            (None, "MOVE", ["0", "R2"]),
+            (None, "OR", ["R0", "R0", "R0"]),
+            (None, "JP_P", ["DIV_1"]),
+            (None, "SUB", ["R2", "R0", "R0"]),
+            ("DIV_1", "OR", ["R1", "R1", "R1"]),
+            (None, "RET_Z", []),
+            (None, "JP_P", ["DIV_2"]),
+            (None, "SUB", ["R2", "R1", "R1"]),
+            ("DIV_2", "MOVE", ["1", "R4"]),
+            ("DIV_3", "CMP", ["R1", "R0"]),
+            (None, "JP_UGE", ["DIV_4"]),
+            (None, "SHL", ["R1", "1", "R1"]),
+            (None, "SHL", ["R4", "1", "R4"]),
+            (None, "JP", ["DIV_3"]),
+            ("DIV_4", "CMP", ["R0", "R1"]),
+            (None, "JP_ULT", ["DIV_5"]),
+            (None, "SUB", ["R0", "R1", "R0"]),
+            (None, "OR", ["R2", "R4", "R2"]),
+            ("DIV_5", "SHR", ["R1", "1", "R1"]),
+            (None, "SHR", ["R4", "1", "R4"]),
+            (None, "JP_NZ", ["DIV_4"]),
+            (None, "OR", ["R3", "R3", "R3"]),
+            (None, "RET_P", []),
+            (None, "MOVE", ["0", "R3"]),
+            (None, "SUB", ["R3", "R2", "R2"]),
+            (None, "RET", []),
+        ],
+    }
+
+    CHANGES = {"MUL": ("R0", "R1", "R2"), "DIV": ("R0", "R1", "R2", "R3", "R4")}
+
+    def __init__(self, program, stats=None):
+        self.program = program
+        self.stats = stats
+        self.allocation = None
+        self.registers = dict()
+        self.code = list()
+        self.data = list()
+        self.slots = dict()
+        self.constants = dict()
+        self.runtime = set()
+        self.loops = 0
+        self.jumps = 0
+        self.label = None
+
+    def emit(self, operation, *operands, comment=None):
+        self.code.append(FriscInstruction(operation, operands, self.label, comment))
+        self.label = None
+
+    def jump_label(self):
+        self.jumps += 1
+        return "J{}".format(self.jumps - 1)
+
+    def slot(self, operand):
+        label = self.slots.get(operand)
+        if label is None:
+            if isinstance(operand, Variable):
+                label = "V{}".format(operand.index)
+                comment = "{} {}".format(operand.name, operand.line)
+            else:
+                label = "T{}".format(operand.index)
+                comment = None
+            self.slots[operand] = label
+            self.data.append(FriscInstruction("DW", ["0"], label, comment))
+        return "({})".format(label)
+
+    def constant(self, value):
+        label = self.constants.get(value)
+        if label is None:
+            label = self.constants[value] = "C{}".format(len(self.constants))
+        return "({})".format(label)
+
+    def load(self, operand, register):
+        if operand in self.registers:
+            if self.registers[operand] != register:
+                self.emit("MOVE", self.registers[operand], register)
+        elif not isinstance(operand, int):
+            self.emit("LOAD", register, self.slot(operand))
+        elif fits_immediate(operand):
+            self.emit("MOVE", frisc_number(operand), register)
+        else:
+            self.emit("LOAD", register, self.constant(operand))
+
+    def source(self, operand, register):
+        """ Second ALU operand: immediate if it fits, else loaded register """
+        if isinstance(operand, int) and fits_immediate(operand):
+            return frisc_number(operand)
+        return self.register(operand, register)
+
+    def register(self, operand, register):
+        """ Register holding operand: its own, else register loaded with it """
+        if operand in self.registers:
+            return self.registers[operand]
+        self.load(operand, register)
+        return register
+
+    def store(self, register, operand):
+        """ Move the value in register to operand """
+        if operand not in self.registers:
+            self.emit("STORE", register, self.slot(operand))
+        elif self.registers[operand] != register:
+            self.emit("MOVE", register, self.registers[operand])
+
+    def calls(self, instruction):
+        """ Registers changed by the routine instruction calls """
+        op, b = instruction.op, instruction.b
+        if op == "div" and not (self.program.shifts and is_power_of_two(b)):
+            return self.CHANGES["DIV"]
+        if op in ("mul", "pairs"):
+            return self.CHANGES["MUL"]
+        return ()
+
+    def allocate(self):
+        """ Registers of operands from linear-scan allocation """
+        self.allocation = LinearScan(self.program, self.calls)
+        intervals = self.allocation.run()
+        self.registers = {operand: interval.register for operand, interval in intervals.items()
+                          if interval.register is not None}
+        if self.stats is not None:
+            self.stats.count("registers_allocated", len(self.registers))
+            self.stats.count("registers_spilled", len(intervals) - len(self.registers))
+        # values read before any assignment start as 0, as memory words do
+        for interval in sorted(intervals.values(), key=lambda interval: interval.register or ""):
+            if interval.start < 0 and interval.register is not None:
+                self.emit("MOVE", "0", interval.register, comment=repr(interval.operand))
+
+    def generate(self):
+        """ List of FRISC instructions of the program """
+        self.emit("MOVE", self.STACK_TOP, "R7", comment="init stog")
+        if self.program.registers:
+            self.allocate()
+        self.emit_items(self.program.items)
+
+        if self.program.result is not None:
+            comment = "\"vrati\" " + Keywords.RESULT
+            if self.program.result not in self.registers:
+                self.emit("LOAD", "R6", self.slot(self.program.result), comment=comment)
+            elif self.registers[self.program.result] != "R6":
+                self.emit("MOVE", self.registers[self.program.result], "R6", comment=comment)
+        else:
+            self.emit("MOVE", "0", "R6")
+        self.emit("HALT")
+
+        for routine in ("MUL", "DIV"):
+            if routine in self.runtime:
+                self.emit_routine(routine)
+
+        for value, label in self.constants.items():
+            self.data.append(FriscInstruction("DW", [frisc_word(value)], label))
+        return self.code + self.data
+
+    def emit_routine(self, name):
+        for label, operation, operands in self.RUNTIME[name]:
+            self.code.append(FriscInstruction(operation, operands, label))
+
+    def emit_items(self, items):
+        index = 0
+        while index < len(items):
+            item = items[index]
+            if isinstance(item, Loop):
+                self.emit_loop(item)
+            elif index + 1 < len(items) and self.merges(item, items[index + 1]):
+                self.emit_instruction(item, items[index + 1])
+                index += 1
+            else:
+                self.emit_instruction(item)
+            index += 1
+
+    def merges(self, instruction, following):
+        """
+        Whether following only copies the temp instruction assigns, read
+        nowhere else, so instruction can assign the copy's target itself
+        """
+        if self.allocation is None or not isinstance(following, Instruction) or \
+                following.op != "copy" or following.a is not instruction.dest or \
+                not isinstance(instruction.dest, Temp):
+            return False
+        return self.allocation.intervals[instruction.dest].end == \
+            self.allocation.position[following]
+
+    def emit_loop(self, loop):
+        # a loop starting where another one starts shares its label
+        if self.label is None:
+            self.label = "L{}".format(self.loops)
+            self.loops += 1
+        label = self.label
+        self.emit_items(loop.body)
+        self.emit_items(loop.latch)
+        self.emit("CMP", self.register(loop.var, "R0"), self.source(loop.bound, "R1"))
+        self.emit("JP_SLE", label, comment="{} do {}".format(loop.var.name, loop.bound))
+
+    def emit_trips(self, instruction):
+        """ R2 <- trips or pairs of a loop from a to b """
+        self.load(instruction.a, "R0")
+        self.load(instruction.b, "R1")
+        # R2 <- b - a, or 0 when b < a
+        self.emit("SUB", "R1", "R0", "R2")
+        self.emit("CMP", "R1", "R0")
+        ordered = self.jump_label()
+        self.emit("JP_SGE", ordered)
+        self.emit("MOVE", "0", "R2")
+        self.label = ordered
+        if instruction.op == "trips":
+            self.emit("ADD", "R2", "1", "R2")
+            return
+
+        # R2 * (R2 + 1) / 2, halving the even factor
+        even, product = self.jump_label(), self.jump_label()
+        self.emit("SHR", "R2", "1", "R0")
+        self.emit("AND", "R2", "1", "R1")
+        self.emit("JP_Z", even)
+        self.emit("ADD", "R0", "1", "R1")
+        self.emit("MOVE", "R2", "R0")
+        self.emit("JP", product)
+        self.label = even
+        self.emit("ADD", "R2", "1", "R1")
+        self.label = product
+        self.runtime.add("MUL")
+        self.emit_call("MUL", instruction)
+
+    def emit_instruction(self, instruction, copy=None):
+        op, a, b = instruction.op, instruction.a, instruction.b
+        comment = repr(instruction)
+        dest = instruction.dest
+        if copy is not None:
+            comment, dest = "{}, {}".format(comment, copy), copy.dest
+
+        target = self.registers.get(dest, "R2")
+        start = len(self.code)
+        if op == "copy":
+            if dest in self.registers:
+                self.load(a, target)
+            else:
+                self.store(self.register(a, "R0"), dest)
+        elif op == "neg":
+            register = self.register(a, "R1")
+            self.emit("MOVE", "0", "R0")
+            self.emit("SUB", "R0", register, target)
+        elif op in ("add", "sub"):
+            register = self.register(a, "R0")
+            self.emit(op.upper(), register, self.source(b, "R1"), target)
+        elif op in ("trips", "pairs"):
+            self.emit_trips(instruction)
+        elif op == "mul" and self.program.shifts and self.emit_product(a, b):
+            pass
+        elif op == "div" and self.program.shifts and self.emit_quotient(a, b):
+            pass
+        else:
+            self.load(a, "R0")
+            self.load(b, "R1")
+            routine = op.upper()
+            self.runtime.add(routine)
+            self.emit_call(routine, instruction)
+        if op != "copy":
+            self.store(target if op in ("neg", "add", "sub") else "R2", dest)
+        if len(self.code) > start:
+            self.code[-1].comment = comment
+
+    def emit_call(self, routine, instruction):
+        """ CALL routine, keeping allocated registers it changes that stay live """
+        saved = self.allocation.saved(instruction) if self.allocation is not None else []
+        for register in saved:
+            self.emit("PUSH", register)
+        self.emit("CALL", routine)
+        for register in reversed(saved):
+            self.emit("POP", register)
+
+    MAX_DIGITS = 4
+
+    def emit_product(self, a, b):
+        """ R2 <- a * b with shifts and additions if a factor is a constant """
+        factors = [(len(signed_digits(factor)), factor, other)
+                   for factor, other in ((b, a), (a, b)) if isinstance(factor, int)]
+        if len(factors) == 0:
+            return False
+        count, factor, other = min(factors, key=lambda item: item[0])
+        if count > self.MAX_DIGITS:
+            return False
+
+        if count == 0:
+            self.emit("MOVE", "0", "R2")
+            return True
+        # positive digits first, R2 starts from the first of them or 0
+        digits = sorted(signed_digits(factor), reverse=True)
+        self.load(other, "R0")
+        if digits[0][0] < 0:
+            self.emit("MOVE", "0", "R2")
+        elif digits[0][1] > 0:
+            self.emit("SHL", "R0", frisc_number(digits.pop(0)[1]), "R2")
+        else:
+            self.emit("MOVE", "R0", "R2")
+            digits.pop(0)
+        for digit, shift in digits:
+            term = "R0"
+            if shift > 0:
+                term = "R1"
+                self.emit("SHL", "R0", frisc_number(shift), term)
+            self.emit("ADD" if digit > 0 else "SUB", "R2", term, "R2")
+        return True
+
+    def emit_quotient(self, a, b):
+        """ R2 <- a / b with arithmetic shifts if b is a power of two """
+        if not is_power_of_two(b):
+            return False
+        shift = abs(b).bit_length() - 1
+        self.load(a, "R0")
+        if shift == 0:
+            self.emit("MOVE", "R0", "R2")
+        else:
+            # round toward zero: add 2^shift - 1 to negative dividends
+            self.emit("ASHR", "R0", frisc_number(31), "R1")
+            self.emit("SHR", "R1", frisc_number(32 - shift), "R1")
+            self.emit("ADD", "R0", "R1", "R2")
+            self.emit("ASHR", "R2", frisc_number(shift), "R2")
+        if b < 0:
+            self.emit("MOVE", "0", "R1")
+            self.emit("SUB", "R1", "R2", "R2")
+        return True
+
+
+class Peephole:
+    """
+    Peephole optimizer over the emitted FRISC instructions.
+
+    Rules look at neighbouring instructions (or at the whole program for
+    dead stores and jump targets) and run until none applies. An
+    instruction with a label is never removed by a window rule, as
+    another path may jump to it. Counted per rule are the removed
+    instructions, for jump_chain the redirected jumps.
+
+        push_pop     PUSH Rx, POP Ry becomes MOVE Rx, Ry or nothing
+        store_load   a load of a word still in a register becomes a MOVE
+        self_move    MOVE Rx, Rx is removed
+        copy_store   MOVE Rx, Ry and STORE Ry store Rx when Ry is dead after
+        dead_store   stores to words no instruction reads are removed
+        jump_chain   jumps to an unconditional JP go to its target
+        jump_next    jumps to the next instruction are removed
+        unreachable  code after JP, RET or HALT up to a used label is removed
+    """
+
+    RULES = ["push_pop", "store_load", "self_move", "copy_store", "dead_store",
+             "jump_chain", "jump_next", "unreachable"]
+    ALU = ("ADD", "ADC", "SUB", "SBC", "AND", "OR", "XOR", "SHL", "SHR", "ASHR",
+           "ROTL", "ROTR")
+    REGISTERS = {"R{}".format(i) for i in range(8)}
+    JUMPS = ("JP", "CALL", "JR")
+    WINDOW = 64
+
+    def __init__(self, rules=None, stats=None):
+        rules = self.RULES if rules is None else list(rules)
+        unknown = [rule for rule in rules if rule not in self.RULES]
+        if len(unknown) > 0:
+            raise ValueError("unknown peephole rules: {}".format(", ".join(unknown)))
+        self.rules = rules
+        self.stats = stats
+        self.counts = {rule: 0 for rule in rules}
+
+    @staticmethod
+    def base(address):
+        """ Register of an (Rx+offset) address, None for absolute ones """
+        register = address.strip("()").replace("-", "+").split("+")[0].strip()
+        return register if register in Peephole.REGISTERS else None
+
+    def registers(self, instruction):
+        """ Registers read and written, None when the instruction may read any """
+        operation, operands = instruction.operation, instruction.operands
+        if operation in self.ALU:
+            return {operands[0], operands[1]} & self.REGISTERS, {operands[2]}
+        if operation == "CMP":
+            return {operands[0], operands[1]} & self.REGISTERS, set()
+        if operation == "MOVE":
+            return {operands[0]} & self.REGISTERS, {operands[1]} & self.REGISTERS
+        if operation in ("LOAD", "STORE"):
+            base = {self.base(operands[1])} - {None}
+            if operation == "LOAD":
+                return base, {operands[0]}
+            return base | {operands[0]}, set()
+        if operation == "PUSH":
+            return {operands[0], "R7"}, {"R7"}
+        if operation == "POP":
+            return {"R7"}, {operands[0], "R7"}
+        if operation == "HALT":
+            return {"R6"}, set()
+        return None, None
+
+    def dead_after(self, code, index, register):
+        """ Whether register is overwritten after code[index] before it is read """
+        for position in range(index + 1, len(code)):
+            instruction = code[position]
+            if instruction.operation == "DW":
+                return True
+            read, written = self.registers(instruction)
+            if read is None or register in read:
+                return False
+            if register in written:
+                return True
+            if instruction.operation == "HALT":
+                return True
+        return True
+
+    @staticmethod
+    def target(instruction):
+        if instruction.operation.split("_")[0] in Peephole.JUMPS and \
+                len(instruction.operands) == 1 and not instruction.operands[0].startswith("("):
+            return instruction.operands[0]
+        return None
+
+    @staticmethod
+    def unconditional(instruction):
+        return instruction.operation in ("JP", "RET", "HALT")
+
+    def run(self, code):
+        """ Optimized copy of the list of FRISC instructions """
+        code = list(code)
+        changed = True
+        while changed:
+            changed = False
+            self.drop_labels(code)
+            for rule in self.rules:
+                removed = getattr(self, rule)(code)
+                if removed > 0:
+                    self.counts[rule] += removed
+                    changed = True
+
+        if self.stats is not None:
+            for rule, count in self.counts.items():
+                self.stats.count("peephole_" + rule, count)
+        return code
+
+    @staticmethod
+    def drop_labels(code):
+        """ Remove labels of code no instruction refers to, they only block the rules """
+        used = set()
+        for instruction in code:
+            used.update(operand.strip("()") for operand in instruction.operands)
+        for index, instruction in enumerate(code):
+            if instruction.label is not None and instruction.label not in used and \
+                    instruction.operation != "DW":
+                code[index] = FriscInstruction(instruction.operation, instruction.operands,
+                                               None, instruction.comment)
+
+    def window(self, code, rewrite):
+        """ Apply rewrite(first, second) to pairs, it returns the replacement or None """
+        removed = 0
+        index = 0
+        while index < len(code) - 1:
+            first, second = code[index], code[index + 1]
+            replacement = None if second.label is not None else rewrite(index, first, second)
+            if replacement is None:
+                index += 1
+                continue
+            code[index:index + 2] = replacement
+            removed += 2 - len(replacement)
+        return removed
+
+    def push_pop(self, code):
+        def rewrite(index, first, second):
+            if first.operation != "PUSH" or second.operation != "POP":
+                return None
+            if first.operands[0] == second.operands[0]:
+                return [] if first.label is None else None
+            return [FriscInstruction("MOVE", [first.operands[0], second.operands[0]],
+                                     first.label, first.comment)]
+        return self.window(code, rewrite)
+
+    def store_load(self, code):
+        removed = 0
+        index = 0
+        while index < len(code):
+            load = code[index]
+            if load.operation != "LOAD" or load.label is not None:
+                index += 1
+                continue
+            register = self.available(code, index, load.operands[1])
+            if register is None:
+                index += 1
+            elif register == load.operands[0]:
+                del code[index]
+                removed += 1
+            else:
+                code[index] = FriscInstruction("MOVE", [register, load.operands[0]],
+                                               None, load.comment)
+                index += 1
+        return removed
+
+    def available(self, code, index, address):
+        """
+        Register holding the word at address before code[index]: stored to
+        or loaded from it earlier in the same block, at most WINDOW
+        instructions back, and not changed since
+        """
+        written = set()
+        for position in range(index - 1, max(index - self.WINDOW, 0) - 1, -1):
+            instruction = code[position]
+            operation, operands = instruction.operation, instruction.operands
+            if operation in ("STORE", "LOAD") and operands[1] == address and \
+                    operands[0] not in written and \
+                    (operation == "STORE" or self.base(address) != operands[0]):
+                return operands[0]
+            if operation == "STORE" and (operands[1] == address or
+                                         self.base(operands[1]) is not None or
+                                         self.base(address) is not None):
+                return None
+            read, changed = self.registers(instruction)
+            if read is None or instruction.label is not None or operation == "DW":
+                return None
+            written |= changed
+            if self.base(address) in written:
+                return None
+        return None
+
+    def self_move(self, code):
+        removed = 0
+        for index in reversed(range(len(code))):
+            instruction = code[index]
+            if instruction.operation == "MOVE" and instruction.label is None and \
+                    instruction.operands[0] == instruction.operands[1]:
+                del code[index]
+                removed += 1
+        return removed
+
+    def copy_store(self, code):
+        def rewrite(index, first, second):
+            if first.operation != "MOVE" or second.operation != "STORE" or \
+                    first.operands[0] not in self.REGISTERS or \
+                    first.operands[1] != second.operands[0] or \
+                    self.base(second.operands[1]) == first.operands[1] or \
+                    not self.dead_after(code, index + 1, first.operands[1]):
+                return None
+            return [FriscInstruction("STORE", [first.operands[0], second.operands[1]],
+                                     first.label, second.comment)]
+        return self.window(code, rewrite)
+
+    def dead_store(self, code):
+        read = set()
+        for instruction in code:
+            if instruction.operation != "STORE":
+                read.update(operand.strip("()") for operand in instruction.operands)
+            else:
+                read.add(instruction.operands[0])
+        removed = 0
+        for index in reversed(range(len(code))):
+            instruction = code[index]
+            if instruction.operation == "STORE" and instruction.label is None and \
+                    self.base(instruction.operands[1]) is None and \
+                    instruction.operands[1].strip("()") not in read:
+                del code[index]
+                removed += 1
+        return removed
+
+    def jump_chain(self, code):
+        labelled = {instruction.label: instruction for instruction in code
+                    if instruction.label is not None}
+        redirected = 0
+        for index, instruction in enumerate(code):
+            target = self.target(instruction)
+            seen = set()
+            while target is not None and target not in seen and target in labelled and \
+                    labelled[target].operation == "JP" and \
+                    self.target(labelled[target]) is not None:
+                seen.add(target)
+                target = self.target(labelled[target])
+            if target is not None and target != instruction.operands[0] and \
+                    instruction.operation.split("_")[0] != "JR":
+                code[index] = FriscInstruction(instruction.operation,
+                                               [target] + instruction.operands[1:],
+                                               instruction.label, instruction.comment)
+                redirected += 1
+        return redirected
+
+    def jump_next(self, code):
+        removed = 0
+        for index in reversed(range(len(code) - 1)):
+            instruction = code[index]
+            if instruction.operation.split("_")[0] == "JP" and instruction.label is None and \
+                    self.target(instruction) is not None and \
+                    code[index + 1].label == instruction.operands[0]:
+                del code[index]
+                removed += 1
+        return removed
+
+    def unreachable(self, code):
+        used = set()
+        for instruction in code:
+            used.update(operand.strip("()") for operand in instruction.operands)
+        removed = 0
+        index = 0
+        while index < len(code) - 1:
+            if not self.unconditional(code[index]):
+                index += 1
+                continue
+            end = index + 1
+            while end < len(code) and code[end].operation != "DW" and \
+                    (code[end].label is None or code[end].label not in used):
+                end += 1
+            removed += end - index - 1
+            del code[index + 1:end]
+            index += 1
+        return removed
+
+
+def forever(start):
+    """ Values of a loop variable counting up without end, wrapping at 32 bits """
+    while True:
+        yield start
+        start = wrap(start + 1)
+
+
+class PythonBackend:
+    """
+    Runs the IR as Python code.
+
+    The program becomes the source of one function, compiled once.
+    Variables and temps are its locals, temps used once are inlined
+    into the expression using them and every operation wraps to 32 bits.
+    Division truncates towards zero, by zero it gives 0 as the FRISC
+    routine does.
+
+    A loop whose variable is only changed by its increment and whose
+    bound does not depend on the loop becomes a range loop, running
+    once when the bound is below the start as the FRISC loop does.
+    Others stay 'while True' loops checking the bound at the end.
+    """
+
+    INT_MAX = (1 << 31) - 1
+    WRAP = "(({}) + 2147483648 & 4294967295) - 2147483648"
+    OPERATORS = {"add": "+", "sub": "-", "mul": "*"}
+
+    def __init__(self, program):
+        self.program = program
+        self.lines = None
+        self.uses = None
+        self.bounds = 0
+
+    @staticmethod
+    def name(operand):
+        return "v{}".format(operand.index) if isinstance(operand, Variable) \
+            else "t{}".format(operand.index)
+
+    def source(self):
+        """ Python source of the function 'program' returning rez """
+        self.uses = dict()
+        for instruction in walk_instructions(self.program.items):
+            for operand in instruction.operands():
+                if isinstance(operand, Temp):
+                    self.uses[operand] = self.uses.get(operand, 0) + 1
+        for loop in self.loops(self.program.items):
+            if isinstance(loop.bound, Temp):
+                self.uses[loop.bound] = self.uses.get(loop.bound, 0) + 1
+
+        self.lines = ["def program():"]
+        if len(self.program.variables) > 0:
+            self.lines.append("    {} = 0".format(" = ".join(
+                self.name(variable) for variable in self.program.variables)))
+        pending = self.block(self.program.items, 1, dict())
+        self.flush(pending, 1)
+        result = self.program.result
+        self.lines.append("    return {}".format(self.name(result) if result is not None else 0))
+        return "\n".join(self.lines) + "\n"
+
+    @staticmethod
+    def loops(items):
+        stack = [items]
+        while len(stack) > 0:
+            for item in stack.pop():
+                if isinstance(item, Loop):
+                    stack.append(item.body)
+                    yield item
+
+    def compile(self):
+        """ The function 'program' compiled from the source """
+        namespace = {"divide": divide, "forever": forever, "trips": trips, "pairs": pairs}
+        exec(compile(self.source(), "<pj>", "exec"), namespace)
+        return namespace["program"]
+
+    def run(self):
+        return self.compile()()
+
+    def operand(self, operand, pending, reads):
+        """ Python expression of an operand, consuming an inlined temp """
+        if isinstance(operand, int):
+            return str(operand) if operand >= 0 else "({})".format(operand)
+        if operand in pending:
+            expression, operand_reads = pending.pop(operand)
+            reads |= operand_reads
+            return "({})".format(expression)
+        if isinstance(operand, Variable):
+            reads.add(operand)
+        return self.name(operand)
+
+    def expression(self, instruction, pending):
+        """ Python expression of an instruction and the variables it reads """
+        reads = set()
+        a = self.operand(instruction.a, pending, reads)
+        if instruction.op == "copy":
+            return a, reads
+        if instruction.op == "neg":
+            return self.WRAP.format("-" + a), reads
+        b = self.operand(instruction.b, pending, reads)
+        if instruction.op == "div":
+            return "divide({}, {}) or 0".format(a, b), reads
+        if instruction.op in ("trips", "pairs"):
+            return "{}({}, {})".format(instruction.op, a, b), reads
+        return self.WRAP.format("{} {} {}".format(a, self.OPERATORS[instruction.op], b)), reads
+
+    def emit(self, line, depth):
+        self.lines.append("    " * depth + line)
+
+    def flush(self, pending, depth, variable=None):
+        """ Assign pending temps (those reading variable if given) to their locals """
+        for temp in [temp for temp, (_, reads) in pending.items()
+                     if variable is None or variable in reads]:
+            expression, _ = pending.pop(temp)
+            self.emit("{} = {}".format(self.name(temp), expression), depth)
+
+    def block(self, items, depth, pending):
+        """ Emit items, return the temps still waiting to be inlined """
+        for item in items:
+            if isinstance(item, Loop):
+                self.flush(pending, depth)
+                self.loop(item, depth)
+                continue
+
+            expression, reads = self.expression(item, pending)
+            if isinstance(item.dest, Temp) and self.uses.get(item.dest, 0) == 1:
+                pending[item.dest] = (expression, reads)
+                continue
+            if isinstance(item.dest, Variable):
+                self.flush(pending, depth, item.dest)
+            self.emit("{} = {}".format(self.name(item.dest), expression), depth)
+        return pending
+
+    def is_range(self, loop):
+        increment = loop.latch[0]
+        if not (increment.op == "add" and increment.dest is loop.var and
+                increment.a is loop.var and increment.b == 1):
+            return False
+        changed = assigned_in(loop.body)
+        if loop.var in changed:
+            return False
+        changed.add(loop.var)
+        bound_code = loop.latch[1:]
+        if any(not isinstance(instruction.dest, Temp) for instruction in bound_code):
+            return False
+        reads = {operand for instruction in bound_code for operand in instruction.operands()}
+        reads.add(loop.bound)
+        return len(reads & changed) == 0
+
+    def loop(self, loop, depth):
+        var = self.name(loop.var)
+        if self.is_range(loop):
+            pending = self.block(loop.latch[1:], depth, dict())
+            bound = self.operand(loop.bound, pending, set())
+            self.flush(pending, depth)
+            if isinstance(loop.bound, int):
+                values = "range({0}, max({1}, {0}) + 1)".format(var, bound) \
+                    if loop.bound < self.INT_MAX else "forever({})".format(var)
+            else:
+                name = "b{}".format(self.bounds)
+                self.bounds += 1
+                self.emit("{} = {}".format(name, bound), depth)
+                values = "(range({0}, max({1}, {0}) + 1) if {1} < {2} else forever({0}))" \
+                    .format(var, name, self.INT_MAX)
+            self.emit("for {} in {}:".format(var, values), depth)
+            size = len(self.lines)
+            self.flush(self.block(loop.body, depth + 1, dict()), depth + 1)
+            if len(self.lines) == size:
+                self.emit("pass", depth + 1)
+            return
+
+        self.emit("while True:", depth)
+        pending = self.block(loop.body, depth + 1, dict())
+        pending = self.block(loop.latch, depth + 1, pending)
+        bound = self.operand(loop.bound, pending, set())
+        self.flush(pending, depth + 1)
+        self.emit("if {} > {}:".format(var, bound), depth + 1)
+        self.emit("break", depth + 2)
+
+
+class FRISCGenerator:
+    """
+    Code generator for language 'PJ'.
+
+    Input:
+        generative tree of a semantically valid program, as text
+        from the syntax analyzer or as its AST object, IDN tokens
+        carry their symbol ids
+
+    Output:
+        FRISC program leaving the value of the global variable rez
+        in R6 before HALT, written to a.frisc
+    """
+
+    def __init__(self, tree, passes=(), debug_flag=False, stats=None, peephole=()):
+        self.tree = load_tree(tree) if isinstance(tree, str) else tree
+        self.passes = list(passes)
+        self.peephole = list(peephole)
+        self.debug_flag = debug_flag
+        self.stats = stats
+        self.program = None
+        self.instructions = None
+
+    def debug(self, msg, *args):
+        """ Print debug message, formatted only when it is printed """
+        if self.debug_flag:
+            print("DEBUG: {}".format(str(msg).format(*args)))
+        else:
+            pass
+
+    def lower(self):
+        """ IR of the tree after the optimization passes """
+        if self.program is None:
+            self.program = Lowering().lower(self.tree)
+            PassManager(self.passes, self.stats).run(self.program)
+            self.debug("IR:\n{}", self.program)
+        return self.program
+
+    def evaluate(self):
+        """ Value of rez, computed by the Python backend instead of FRISC """
+        return PythonBackend(self.lower()).run()
+
+    def generate(self):
+        self.instructions = Emitter(self.lower(), self.stats).generate()
+        if len(self.peephole) > 0:
+            self.instructions = Peephole(self.peephole, self.stats).run(self.instructions)
+        if self.stats is not None:
+            self.stats.count("frisc_instructions",
+                             sum(1 for i in self.instructions if i.operation != "DW"))
+        return self.instructions
+
+    def write(self, stream):
+        stream.write("".join("{}\n".format(instruction) for instruction in self.instructions))
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="FRISC code generator for language 'PJ'")
+    arg_parser.add_argument("--output", metavar="PATH",
+                            default=os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                 "a.frisc"),
+                            help="FRISC program file (default: a.frisc next to the generator)")
+    arg_parser.add_argument("--passes", default="",
+                            help="comma separated optimization passes to run, of: {}".format(
+                                ", ".join(optimization.name
+                                          for optimization in PassManager.PASSES)))
+    arg_parser.add_argument("--peephole", nargs="?", const=",".join(Peephole.RULES), default="",
+                            help="comma separated peephole rules to run on the FRISC code "
+                                 "(all when given without rules), of: {}".format(
+                                     ", ".join(Peephole.RULES)))
+    arg_parser.add_argument("-O", dest="optimize", action="store_true",
+                            help="run all optimization passes and peephole rules")
+    arg_parser.add_argument("--run", action="store_true",
+                            help="print the value of rez computed by the Python backend "
+                                 "instead of writing a.frisc")
+    arg_parser.add_argument("--ir", action="store_true",
+                            help="print the IR after the passes to stderr")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write phase timings and counters as JSON to stderr")
+    args = arg_parser.parse_args()
+
+    stats = Stats() if args.stats else None
+    passes = PassManager.DEFAULT if args.optimize else \
+        [name for name in args.passes.split(",") if len(name) > 0]
+    peephole = Peephole.RULES if args.optimize else \
+        [rule for rule in args.peephole.split(",") if len(rule) > 0]
+
+    with stats.phase("read") if stats else nullcontext():
+        tree = load_tree(sys.stdin.read())
+
+    generator = FRISCGenerator(tree, passes, stats=stats, peephole=peephole)
+
+    if args.run:
+        with stats.phase("python") if stats else nullcontext():
+            print(generator.evaluate())
+        if stats is not None:
+            stats.dump()
+        return
+
+    with stats.phase("generator") if stats else nullcontext():
+        generator.generate()
+
+    if args.ir:
+        sys.stderr.write("{}\n".format(generator.program))
+
+    with stats.phase("output") if stats else nullcontext():
+        with open(args.output, "w") as f:
+            generator.write(f)
+
+    if stats is not None:
+        stats.dump()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,516 @@
+import argparse
+import json
+import os
+import re
+import sys
+from contextlib import nullcontext
+
+LEXER_DIRECTORY = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                os.pardir, "1-Lexical-Analysis"))
+if LEXER_DIRECTORY not in sys.path:
+    sys.path.insert(0, LEXER_DIRECTORY)
+
+from LeksickiAnalizator import Stats  # noqa: E402
+
+
+class AssemblerException(Exception):
+    """ Error in the FRISC source, with its line number """
+
+    def __init__(self, line_number, message):
+        self.line_number = line_number
+        self.message = message
+        super().__init__(str(self))
+
+    def __str__(self):
+        return "line {}: {}".format(self.line_number, self.message)
+
+
+class SimulatorException(Exception):
+    """ Error while running the program """
+    pass
+
+
+class Opcodes:
+    """ Decoded operations, numbered in the order the dispatch loop tests them """
+
+    ALU_REG = 0
+    ALU_IMM = 1
+    LOAD = 2
+    STORE = 3
+    JP = 4
+    CMP_REG = 5
+    CMP_IMM = 6
+    MOVE_IMM = 7
+    MOVE_REG = 8
+    CALL = 9
+    RET = 10
+    PUSH = 11
+    POP = 12
+    JR = 13
+    HALT = 14
+
+    """ Operations of the ALU """
+    ALU = {
+        "ADD": 0, "ADC": 1, "SUB": 2, "SBC": 3, "AND": 4, "OR": 5, "XOR": 6,
+        "SHL": 7, "SHR": 8, "ASHR": 9, "ROTL": 10, "ROTR": 11
+    }
+
+    """ Condition codes of JP, CALL, RET and JR """
+    CONDITIONS = {
+        "": 0, "C": 1, "NC": 2, "V": 3, "NV": 4, "N": 5, "M": 5, "NN": 6, "P": 6,
+        "Z": 7, "EQ": 7, "NZ": 8, "NE": 8, "ULE": 9, "UGT": 10, "ULT": 2, "UGE": 1,
+        "SLT": 11, "SGE": 12, "SLE": 13, "SGT": 14
+    }
+
+
+MASK = 0xFFFFFFFF
+
+
+def condition_table():
+    """ For every condition code, whether it holds for flags C | V << 1 | N << 2 | Z << 3 """
+    tests = [
+        lambda c, v, n, z: True,
+        lambda c, v, n, z: c == 1,
+        lambda c, v, n, z: c == 0,
+        lambda c, v, n, z: v == 1,
+        lambda c, v, n, z: v == 0,
+        lambda c, v, n, z: n == 1,
+        lambda c, v, n, z: n == 0,
+        lambda c, v, n, z: z == 1,
+        lambda c, v, n, z: z == 0,
+        lambda c, v, n, z: c == 0 or z == 1,
+        lambda c, v, n, z: c == 1 and z == 0,
+        lambda c, v, n, z: n != v,
+        lambda c, v, n, z: n == v,
+        lambda c, v, n, z: n != v or z == 1,
+        lambda c, v, n, z: n == v and z == 0,
+    ]
+    return [tuple(test(f & 1, f >> 1 & 1, f >> 2 & 1, f >> 3 & 1) for f in range(16))
+            for test in tests]
+
+
+TAKEN = condition_table()
+MEMORY_WORDS = 0x40000 // 4
+
+REGISTERS = {"R{}".format(i): i for i in range(8)}
+REGISTERS["SP"] = 7
+STATUS_REGISTER = "SR"
+
+NUMBER = re.compile(r"^([+-]?)\s*(%[BDH])?\s*([0-9A-Fa-f]+)$")
+
+
+class Assembler:
+    """
+    Two-pass assembler for the FRISC instructions the generator uses.
+
+    Every instruction and DW takes one 32-bit word. Numbers are
+    hexadecimal unless prefixed by %D or %B, immediates and absolute
+    addresses are 20-bit and sign extended. The result is a list of
+    decoded instructions (tuples, see <class Opcodes>) indexed by
+    address / 4 and the initial memory words.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.labels = dict()
+        self.code = list()
+        self.memory = [0] * MEMORY_WORDS
+
+    def number(self, text, line_number, bits=None):
+        """ Value of a number or label, labels first as they may look like hex numbers """
+        if text.strip() in self.labels:
+            return self.labels[text.strip()]
+        match = NUMBER.match(text.strip())
+        if match is None:
+            raise AssemblerException(line_number, "invalid number or label '{}'".format(text))
+        sign, base, digits = match.groups()
+        radix = {"%B": 2, "%D": 10, "%H": 16, None: 16}[base]
+        try:
+            value = int(digits, radix)
+        except ValueError:
+            raise AssemblerException(line_number, "invalid number '{}'".format(text))
+        if sign == "-":
+            value = -value
+        if bits is not None:
+            if not -(1 << (bits - 1)) <= value < (1 << bits):
+                raise AssemblerException(line_number, "'{}' does not fit in {} bits"
+                                         .format(text, bits))
+            value &= (1 << bits) - 1
+            if value & (1 << (bits - 1)):
+                value -= 1 << bits
+        return value & MASK
+
+    def register(self, text, line_number):
+        register = REGISTERS.get(text.strip().upper())
+        if register is None:
+            raise AssemblerException(line_number, "invalid register '{}'".format(text))
+        return register
+
+    def address(self, text, line_number):
+        """ (label) or (number) as absolute address, (Rx+offset) as register and offset """
+        text = text.strip()
+        if not (text.startswith("(") and text.endswith(")")):
+            raise AssemblerException(line_number, "invalid address '{}'".format(text))
+        inner = text[1:-1].replace(" ", "")
+        match = re.match(r"^(R[0-7]|SP)([+-].+)?$", inner, re.IGNORECASE)
+        if match is not None:
+            offset = match.group(2)
+            return (self.register(match.group(1), line_number),
+                    self.number(offset, line_number, 20) if offset else 0)
+        return None, self.number(inner, line_number, 20)
+
+    def split(self):
+        """ (line number, label, operation, operands) of the source lines """
+        lines = list()
+        for line_number, line in enumerate(self.text.split("\n"), start=1):
+            line = line.split(";", 1)[0].rstrip()
+            if len(line.strip()) == 0:
+                continue
+            label = None
+            if not line[0].isspace():
+                parts = line.split(None, 1)
+                label = parts[0]
+                line = parts[1] if len(parts) > 1 else ""
+            parts = line.strip().split(None, 1)
+            operation = parts[0].upper() if len(parts) > 0 else None
+            operands = [operand.strip() for operand in parts[1].split(",")] \
+                if len(parts) > 1 else []
+            lines.append((line_number, label, operation, operands))
+        return lines
+
+    def assemble(self):
+        lines = self.split()
+
+        address = 0
+        for line_number, label, operation, operands in lines:
+            if label is not None:
+                if label in self.labels:
+                    raise AssemblerException(line_number, "label '{}' defined twice"
+                                             .format(label))
+                self.labels[label] = address
+            if operation == "ORG":
+                address = self.number(operands[0], line_number)
+            elif operation is not None:
+                address += 4
+
+        address = 0
+        for line_number, label, operation, operands in lines:
+            if operation is None:
+                continue
+            if operation == "ORG":
+                address = self.number(operands[0], line_number)
+                continue
+            if address // 4 >= MEMORY_WORDS:
+                raise AssemblerException(line_number, "program does not fit in memory")
+            while len(self.code) <= address // 4:
+                self.code.append((Opcodes.HALT, 0, 0, 0, 0))
+            if operation == "DW":
+                self.memory[address // 4] = self.number(operands[0], line_number)
+            else:
+                self.code[address // 4] = self.decode(operation, operands, line_number)
+            address += 4
+
+        return self.code, self.memory
+
+    def decode(self, operation, operands, line_number):
+        name, _, condition = operation.partition("_")
+        if name in ("JP", "CALL", "RET", "JR"):
+            if condition not in Opcodes.CONDITIONS:
+                raise AssemblerException(line_number, "invalid condition '{}'".format(condition))
+            condition = Opcodes.CONDITIONS[condition]
+        elif condition != "":
+            raise AssemblerException(line_number, "unknown operation '{}'".format(operation))
+
+        expected = {"HALT": 0, "RET": 0, "JP": 1, "CALL": 1, "JR": 1, "PUSH": 1, "POP": 1,
+                    "MOVE": 2, "LOAD": 2, "STORE": 2, "CMP": 2}.get(name)
+        if name in Opcodes.ALU:
+            expected = 3
+        elif expected is None:
+            raise AssemblerException(line_number, "unknown operation '{}'".format(operation))
+        if len(operands) != expected:
+            raise AssemblerException(line_number, "'{}' takes {} operands"
+                                     .format(operation, expected))
+
+        if name in Opcodes.ALU:
+            first = self.register(operands[0], line_number)
+            destination = self.register(operands[2], line_number)
+            if operands[1].strip().upper() in REGISTERS:
+                return (Opcodes.ALU_REG, Opcodes.ALU[name], first,
+                        self.register(operands[1], line_number), destination)
+            return (Opcodes.ALU_IMM, Opcodes.ALU[name], first,
+                    self.number(operands[1], line_number, 20), destination)
+        if name == "CMP":
+            first = self.register(operands[0], line_number)
+            if operands[1].strip().upper() in REGISTERS:
+                return Opcodes.CMP_REG, first, self.register(operands[1], line_number), 0, 0
+            return Opcodes.CMP_IMM, first, self.number(operands[1], line_number, 20), 0, 0
+        if name == "MOVE":
+            source, destination = operands[0].strip().upper(), operands[1].strip().upper()
+            to_status = destination == STATUS_REGISTER
+            if not to_status:
+                destination = self.register(destination, line_number)
+            if source == STATUS_REGISTER:
+                return Opcodes.MOVE_REG, -1, destination, to_status, 0
+            if source in REGISTERS:
+                return Opcodes.MOVE_REG, REGISTERS[source], destination, to_status, 0
+            return (Opcodes.MOVE_IMM, self.number(operands[0], line_number, 20),
+                    destination, to_status, 0)
+        if name in ("LOAD", "STORE"):
+            register = self.register(operands[0], line_number)
+            base, offset = self.address(operands[1], line_number)
+            opcode = Opcodes.LOAD if name == "LOAD" else Opcodes.STORE
+            return opcode, register, -1 if base is None else base, offset, 0
+        if name in ("PUSH", "POP"):
+            opcode = Opcodes.PUSH if name == "PUSH" else Opcodes.POP
+            return opcode, self.register(operands[0], line_number), 0, 0, 0
+        if name in ("JP", "CALL"):
+            target = operands[0].strip()
+            if target.startswith("("):
+                base, offset = self.address(target, line_number)
+                if base is None:
+                    raise AssemblerException(line_number, "invalid jump target")
+                target = (base,)
+            else:
+                target = self.number(target, line_number) & 0xFFFFF
+            opcode = Opcodes.JP if name == "JP" else Opcodes.CALL
+            return opcode, condition, target, 0, 0
+        if name == "JR":
+            return Opcodes.JR, condition, self.number(operands[0], line_number) & 0xFFFFF, 0, 0
+        if name == "RET":
+            return Opcodes.RET, condition, 0, 0, 0
+        return Opcodes.HALT, 0, 0, 0, 0
+
+
+class FRISCSimulator:
+    """
+    FRISC processor running an assembled program.
+
+    The program is assembled once into decoded instructions, the dispatch
+    loop then only indexes lists. Memory is 256 KiB of words, only aligned
+    word accesses are supported and code is not readable or writable as
+    data. Flags are kept as four ints and packed into SR only for MOVE.
+
+    Counted are retired instructions, data loads and stores (stack
+    accesses of PUSH, POP, CALL and RET included) and cycles, taken as
+    one per instruction plus one per data access.
+    """
+
+    def __init__(self, text, limit=None):
+        self.code, self.memory = Assembler(text).assemble()
+        self.registers = [0] * 8
+        self.flags = [0, 0, 0, 0]
+        self.pc = 0
+        self.limit = limit
+        self.instructions = 0
+        self.loads = 0
+        self.stores = 0
+
+    @property
+    def cycles(self):
+        return self.instructions + self.loads + self.stores
+
+    def run(self):
+        """ Run until HALT, return the signed value of R6 """
+        code = self.code
+        memory = self.memory
+        registers = self.registers
+        c, v, n, z = self.flags
+        pc = self.pc
+        retired = 0
+        loads = 0
+        stores = 0
+        limit = self.limit if self.limit is not None else -1
+        taken = TAKEN
+
+        ALU_IMM, ALU_REG, LOAD, STORE = Opcodes.ALU_IMM, Opcodes.ALU_REG, Opcodes.LOAD, Opcodes.STORE
+        MOVE_IMM, MOVE_REG, CMP_IMM = Opcodes.MOVE_IMM, Opcodes.MOVE_REG, Opcodes.CMP_IMM
+        JP, CALL, RET, JR = Opcodes.JP, Opcodes.CALL, Opcodes.RET, Opcodes.JR
+        PUSH, POP = Opcodes.PUSH, Opcodes.POP
+
+        while True:
+            try:
+                opcode, a, b, d, e = code[pc]
+            except IndexError:
+                raise SimulatorException("jump outside of the program: {:X}".format(pc * 4))
+            if retired == limit:
+                raise SimulatorException("instruction limit {} reached".format(limit))
+            pc += 1
+            retired += 1
+
+            if opcode <= ALU_IMM:
+                x = registers[b]
+                y = d if opcode == ALU_IMM else registers[d]
+                if a == 0:
+                    result = x + y
+                    c = result >> 32
+                    result &= MASK
+                    v = (~(x ^ y) & (x ^ result)) >> 31 & 1
+                elif a == 2:
+                    result = x + (~y & MASK) + 1
+                    c = result >> 32
+                    result &= MASK
+                    v = ((x ^ y) & (x ^ result)) >> 31 & 1
+                elif a == 1:
+                    result = x + y + c
+                    c = result >> 32
+                    result &= MASK
+                    v = (~(x ^ y) & (x ^ result)) >> 31 & 1
+                elif a == 3:
+                    result = x + (~y & MASK) + c
+                    c = result >> 32
+                    result &= MASK
+                    v = ((x ^ y) & (x ^ result)) >> 31 & 1
+                elif a == 4:
+                    result = x & y
+                    c = v = 0
+                elif a == 5:
+                    result = x | y
+                    c = v = 0
+                elif a == 6:
+                    result = x ^ y
+                    c = v = 0
+                else:
+                    shift = y & 31
+                    if a == 7:
+                        c = (x << shift) >> 32 & 1 if shift else 0
+                        result = (x << shift) & MASK
+                    elif a == 8:
+                        c = (x >> (shift - 1)) & 1 if shift else 0
+                        result = x >> shift
+                    elif a == 9:
+                        signed = x - (1 << 32) if x >> 31 else x
+                        c = (signed >> (shift - 1)) & 1 if shift else 0
+                        result = (signed >> shift) & MASK
+                    elif a == 10:
+                        result = ((x << shift) | (x >> (32 - shift))) & MASK
+                        c = result & 1 if shift else 0
+                    else:
+                        result = ((x >> shift) | (x << (32 - shift))) & MASK
+                        c = result >> 31 if shift else 0
+                    v = 0
+                n = result >> 31
+                z = 1 if result == 0 else 0
+                registers[e] = result
+            elif opcode == LOAD:
+                loads += 1
+                registers[a] = memory[((d if b == -1 else registers[b] + d) & 0x3FFFF) >> 2]
+            elif opcode == STORE:
+                stores += 1
+                memory[((d if b == -1 else registers[b] + d) & 0x3FFFF) >> 2] = registers[a]
+            elif opcode <= CMP_IMM and opcode >= JP:
+                if opcode == JP:
+                    if taken[a][c | v << 1 | n << 2 | z << 3]:
+                        pc = registers[b[0]] >> 2 if type(b) is tuple else b >> 2
+                    continue
+                x = registers[a]
+                y = b if opcode == CMP_IMM else registers[b]
+                result = x + (~y & MASK) + 1
+                c = result >> 32
+                result &= MASK
+                v = ((x ^ y) & (x ^ result)) >> 31 & 1
+                n = result >> 31
+                z = 1 if result == 0 else 0
+            elif opcode == MOVE_IMM:
+                if d:
+                    c, v, n, z = a & 1, a >> 1 & 1, a >> 2 & 1, a >> 3 & 1
+                else:
+                    registers[b] = a
+            elif opcode == MOVE_REG:
+                value = c | v << 1 | n << 2 | z << 3 if a == -1 else registers[a]
+                if d:
+                    c, v, n, z = value & 1, value >> 1 & 1, value >> 2 & 1, value >> 3 & 1
+                else:
+                    registers[b] = value
+            elif opcode == CALL:
+                if taken[a][c | v << 1 | n << 2 | z << 3]:
+                    registers[7] = (registers[7] - 4) & MASK
+                    memory[(registers[7] & 0x3FFFF) >> 2] = pc * 4
+                    stores += 1
+                    pc = registers[b[0]] >> 2 if type(b) is tuple else b >> 2
+            elif opcode == RET:
+                if taken[a][c | v << 1 | n << 2 | z << 3]:
+                    pc = memory[(registers[7] & 0x3FFFF) >> 2] >> 2
+                    registers[7] = (registers[7] + 4) & MASK
+                    loads += 1
+            elif opcode == PUSH:
+                registers[7] = (registers[7] - 4) & MASK
+                memory[(registers[7] & 0x3FFFF) >> 2] = registers[a]
+                stores += 1
+            elif opcode == POP:
+                registers[a] = memory[(registers[7] & 0x3FFFF) >> 2]
+                registers[7] = (registers[7] + 4) & MASK
+                loads += 1
+            elif opcode == JR:
+                if taken[a][c | v << 1 | n << 2 | z << 3]:
+                    pc = ((pc * 4 + b) & 0xFFFFF) >> 2
+            else:
+                break
+
+        self.flags = [c, v, n, z]
+        self.pc = pc - 1
+        self.instructions += retired
+        self.loads += loads
+        self.stores += stores
+        return self.signed(registers[6])
+
+    @staticmethod
+    def signed(value):
+        return value - (1 << 32) if value >> 31 else value
+
+    def state(self):
+        """ Registers, flags, counters and nonzero data words as a dict """
+        return {
+            "registers": {"R{}".format(i): self.signed(value)
+                          for i, value in enumerate(self.registers)},
+            "flags": dict(zip("CVNZ", self.flags)),
+            "pc": self.pc * 4,
+            "memory": {"{:05X}".format(address * 4): self.signed(value)
+                       for address, value in enumerate(self.memory) if value != 0},
+            "instructions": self.instructions,
+            "loads": self.loads,
+            "stores": self.stores,
+            "cycles": self.cycles
+        }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="FRISC simulator")
+    arg_parser.add_argument("program", nargs="?", default="a.frisc",
+                            help="FRISC source file (default: a.frisc)")
+    arg_parser.add_argument("--limit", type=int, default=None,
+                            help="stop with an error when the program does not halt within "
+                                 "this many instructions")
+    arg_parser.add_argument("--state", action="store_true",
+                            help="write registers, memory and counters as JSON to stderr")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write phase timings and counters as JSON to stderr")
+    args = arg_parser.parse_args()
+
+    stats = Stats() if args.stats else None
+
+    with open(args.program) as f:
+        text = f.read()
+
+    try:
+        with stats.phase("assembler") if stats else nullcontext():
+            simulator = FRISCSimulator(text, args.limit)
+        with stats.phase("simulator") if stats else nullcontext():
+            result = simulator.run()
+    except (AssemblerException, SimulatorException) as e:
+        sys.stderr.write("{}\n".format(e))
+        exit(1)
+
+    print(result)
+
+    if args.state:
+        json.dump(simulator.state(), sys.stderr, indent=2)
+        sys.stderr.write("\n")
+
+    if stats is not None:
+        for name in ("instructions", "loads", "stores", "cycles"):
+            stats.count(name, getattr(simulator, name))
+        stats.dump()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import unittest
+
+from FRISCSimulator import FRISCSimulator, SimulatorException
+
+
+class LimitTest(unittest.TestCase):
+
+    # 2 + 3 * 4 instructions up to HALT
+    PROGRAM = """        MOVE 0, R6
+        MOVE 3, R0
+LOOP    ADD R6, R0, R6
+        SUB R0, 1, R0
+        CMP R0, 0
+        JP_NE LOOP
+        HALT
+"""
+
+    def test_halt_at_the_limit(self):
+        simulator = FRISCSimulator(self.PROGRAM, limit=15)
+        self.assertEqual(simulator.run(), 6)
+        self.assertEqual(simulator.instructions, 15)
+
+    def test_limit_before_halt(self):
+        with self.assertRaisesRegex(SimulatorException, "instruction limit 14 reached"):
+            FRISCSimulator(self.PROGRAM, limit=14).run()
+
+    def test_no_limit(self):
+        simulator = FRISCSimulator(self.PROGRAM)
+        self.assertEqual(simulator.run(), 6)
+        self.assertEqual(simulator.instructions, 15)
+
+
+if __name__ == "__main__":
+    unittest.main()
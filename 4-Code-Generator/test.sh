@@ -6,7 +6,15 @@ passed=0
 
 for t in $TEST_FOLDER/*;
 do
-    python3.8 FRISCGenerator.py < $t/Test.in > /tmp/Test.out
+    args=$(cat $t/Test.args 2>/dev/null)
+
+    if [[ " $args " == *" --run "* ]];
+    then
+        python3.8 FRISCGenerator.py $args < $t/Test.in > /tmp/Test.out
+    else
+        python3.8 FRISCGenerator.py $args < $t/Test.in
+        python3.8 FRISCSimulator.py a.frisc > /tmp/Test.out
+    fi
     diff -s $t/Test.out /tmp/Test.out
 
     if [[ $(diff -s $t/Test.out /tmp/Test.out ) == *"identical"* ]];
@@ -18,3 +26,5 @@ done
 total=$(find $TEST_FOLDER/* -type d | wc -l)
 echo -e "\nPassed: $passed \nTotal : $total"
 
+
+python3.8 -m unittest -q TestFRISCSimulator
@@ -0,0 +1,339 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from Prevoditelj import lexical, syntax, semantic, codegen
+
+
+class ProgramGenerator:
+    """
+    Seeded generator of semantically valid programs in language 'PJ'.
+
+    The program has the given number of statements, 'za' loops nested
+    at most depth deep and expressions of expression_length operands,
+    its names are taken from a pool of identifiers names. A name is only
+    used where a definition of it is visible, the last statement assigns
+    rez in the global scope. The loop variable is defined before the
+    range of its loop is read, so the range does not use its name. The
+    same arguments give the same program.
+    """
+
+    LOOP_PROBABILITY = 0.2
+    MAX_BODY = 8
+    MAX_NUMBER = 1000
+
+    def __init__(self, statements=1000, depth=3, expression_length=4, identifiers=20, seed=0):
+        self.statements = max(statements, 1)
+        self.depth = depth
+        self.expression_length = max(expression_length, 1)
+        self.names = ["v{}".format(i) for i in range(max(identifiers, 1))]
+        self.seed = seed
+        self.random = None
+        self.visible = None
+        self.defined = None
+        self.hidden = None
+        self.remaining = 0
+
+    def generate(self):
+        """ Source text of the program """
+        self.random = random.Random(self.seed)
+        self.visible = list()
+        self.defined = dict()
+        self.remaining = self.statements - 1
+
+        lines = list()
+        while self.remaining > 0:
+            self.statement(lines, 0)
+        lines.append("rez = {}".format(self.expression(self.expression_length)))
+        return "\n".join(lines) + "\n"
+
+    def define(self, name):
+        self.visible.append(name)
+        self.defined[name] = self.defined.get(name, 0) + 1
+
+    def exit_scope(self, size):
+        for name in self.visible[size:]:
+            self.defined[name] -= 1
+            if self.defined[name] == 0:
+                del self.defined[name]
+        del self.visible[size:]
+
+    def statement(self, lines, depth):
+        self.remaining -= 1
+        margin = "    " * depth
+
+        if depth < self.depth and self.remaining > 0 and \
+                self.random.random() < self.LOOP_PROBABILITY:
+            variable = self.random.choice(self.names)
+            self.hidden = variable
+            start = self.expression(self.expression_length)
+            bound = self.expression(self.expression_length)
+            self.hidden = None
+            size = len(self.visible)
+            self.define(variable)
+            lines.append("{}za {} od {} do {}".format(margin, variable, start, bound))
+            for _ in range(self.random.randint(1, min(self.MAX_BODY, self.remaining))):
+                if self.remaining == 0:
+                    break
+                self.statement(lines, depth + 1)
+            lines.append(margin + "az")
+            self.exit_scope(size)
+            return
+
+        if len(self.defined) > 0 and self.random.random() < 0.5:
+            target = self.random.choice(self.visible)
+        else:
+            target = self.random.choice(self.names)
+        value = self.expression(self.expression_length)
+        if target not in self.defined:
+            self.define(target)
+        lines.append("{}{} = {}".format(margin, target, value))
+
+    def expression(self, length):
+        return self.join([self.operand() for _ in range(length)])
+
+    def join(self, operands):
+        parts = [operands[0]]
+        for operand in operands[1:]:
+            parts += [self.random.choice("+-*/"), operand]
+        return " ".join(parts)
+
+    def operand(self):
+        """ Primary, negated primary or parenthesised expression of primaries """
+        choice = self.random.random()
+        if choice < 0.1:
+            return "-" + self.primary()
+        if choice < 0.2:
+            primaries = [self.primary() for _ in range(self.random.randint(2, 3))]
+            return "({})".format(self.join(primaries))
+        return self.primary()
+
+    def primary(self):
+        if len(self.visible) > 0 and self.random.random() < 0.6:
+            name = self.random.choice(self.visible)
+            if name != self.hidden:
+                return name
+        return str(self.random.randint(0, self.MAX_NUMBER))
+
+
+class Benchmark:
+    """
+    Throughput of the phases on one source.
+
+    Every phase runs repeat times without instrumentation and the best
+    time counts, once more with <class Stats> of the lexer module for
+    its counters (tokens, AST nodes, semantic lookups, IR and FRISC
+    instructions) and once under tracemalloc for the peak memory it
+    allocates. Phases get the results of the previous phase, built once
+    outside the measured runs, and share one symbol table as in the
+    compiler driver.
+    """
+
+    SEMANTIC_ENGINES = {
+        "text": lambda tree, symbols, stats: semantic.Semantic(tree, False, symbols, stats),
+        "tree": lambda tree, symbols, stats: semantic.TreeSemantic(tree, False, symbols, stats),
+        "incremental": lambda tree, symbols, stats:
+            semantic.IncrementalSemantic(tree, False, symbols, stats)
+    }
+
+    def __init__(self, source, repeat=3, lexer="compact", parser="stack", analyzer="tree",
+                 passes=(), peephole=()):
+        self.source = source
+        self.repeat = max(repeat, 1)
+        self.lexer = lexer
+        self.parser = parser
+        self.analyzer = analyzer
+        self.passes = list(passes)
+        self.peephole = list(peephole)
+        self.symbols = lexical.SymbolTable()
+
+    def lex(self, stats=None):
+        lexer = lexical.ENGINES[self.lexer](self.source, False, self.symbols, stats)
+        lexer.analyze()
+        return lexer.tokens
+
+    def parse(self, tokens, stats=None):
+        parser = syntax.ENGINES[self.parser](tokens, False, self.symbols, stats)
+        parser.parse()
+        return parser.ast_root
+
+    def analyse(self, tree, stats=None):
+        """ Semantic tokens of the AST, given as printed tree for the text engine """
+        analyzer = self.SEMANTIC_ENGINES[self.analyzer](tree, self.symbols, stats)
+        analyzer.analyse()
+        return analyzer.get_tokens()
+
+    def generate(self, ast, stats=None):
+        generator = codegen.FRISCGenerator(ast, self.passes, False, stats, self.peephole)
+        return generator.generate()
+
+    def measure(self, run, rates):
+        """ Result of a phase: best time, counters and rates per second of them """
+        seconds = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            run(None)
+            elapsed = time.perf_counter() - start
+            seconds = elapsed if seconds is None else min(seconds, elapsed)
+
+        stats = lexical.Stats()
+        run(stats)
+
+        tracemalloc.start()
+        run(None)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        result = {"seconds": seconds, "counters": stats.counters,
+                  "peak_allocated_kib": peak // 1024}
+        for name, counter in rates.items():
+            count = stats.counters.get(counter, 0)
+            result[name] = count / seconds if seconds > 0 else None
+        return result
+
+    def run(self):
+        """ Results of all phases as a JSON-ready dict """
+        tokens = self.lex()
+        ast = self.parse(tokens)
+        tree = str(ast) if self.analyzer == "text" else ast
+        self.analyse(tree)
+
+        phases = dict()
+        phases["lexer"] = self.measure(self.lex, {"tokens_per_second": "tokens_lexed"})
+        phases["parser"] = self.measure(lambda stats: self.parse(tokens, stats),
+                                        {"nodes_per_second": "ast_nodes"})
+        phases["semantic"] = self.measure(lambda stats: self.analyse(tree, stats),
+                                          {"lookups_per_second": "semantic_lookups"})
+        phases["codegen"] = self.measure(lambda stats: self.generate(ast, stats),
+                                         {"ir_instructions_per_second": "ir_instructions"})
+
+        return {
+            "engines": {"lexer": self.lexer, "parser": self.parser, "semantic": self.analyzer,
+                        "passes": self.passes, "peephole": self.peephole},
+            "source": {"bytes": len(self.source.encode()),
+                       "lines": self.source.count("\n")},
+            "repeat": self.repeat,
+            "phases": phases,
+            "peak_memory_kib": lexical.Stats().peak_memory()
+        }
+
+
+RATES = ("tokens_per_second", "nodes_per_second", "lookups_per_second",
+         "ir_instructions_per_second")
+
+
+def compare(report, baseline, tolerance):
+    """ Ratios of the rates to the ones of a baseline report and the regressed rates """
+    ratios = dict()
+    regressions = list()
+    for phase, result in report["phases"].items():
+        old = baseline.get("phases", {}).get(phase, {})
+        for rate in RATES:
+            if result.get(rate) and old.get(rate):
+                ratio = result[rate] / old[rate]
+                ratios["{}.{}".format(phase, rate)] = ratio
+                if ratio < 1 - tolerance:
+                    regressions.append("{}.{}".format(phase, rate))
+    return ratios, regressions
+
+
+def revision():
+    """ Commit of the working tree, None outside of git """
+    try:
+        output = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=sys.path[0] or None, timeout=10)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return output.stdout.strip() or None
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Benchmark of the phases of the compiler "
+                                                     "for language 'PJ'")
+    arg_parser.add_argument("--source", type=argparse.FileType("r"),
+                            help="benchmark a source file instead of a generated program")
+    arg_parser.add_argument("--statements", type=int, default=1000,
+                            help="statements of the generated program (default: 1000)")
+    arg_parser.add_argument("--depth", type=int, default=3,
+                            help="maximal nesting of 'za' loops (default: 3)")
+    arg_parser.add_argument("--expression-length", type=int, default=4,
+                            help="operands of an expression (default: 4)")
+    arg_parser.add_argument("--identifiers", type=int, default=20,
+                            help="distinct variable names (default: 20)")
+    arg_parser.add_argument("--seed", type=int, default=0,
+                            help="seed of the program generator (default: 0)")
+    arg_parser.add_argument("--print-program", action="store_true",
+                            help="print the generated program instead of measuring it")
+    arg_parser.add_argument("--repeat", type=int, default=3,
+                            help="timed runs of every phase, the best counts (default: 3)")
+    arg_parser.add_argument("--lexer", choices=lexical.ENGINES.keys(), default="compact",
+                            help="lexing engine (default: compact)")
+    arg_parser.add_argument("--parser", choices=syntax.ENGINES.keys(), default="stack",
+                            help="parsing engine (default: stack)")
+    arg_parser.add_argument("--semantic", choices=Benchmark.SEMANTIC_ENGINES.keys(),
+                            default="tree", help="semantic analysis engine (default: tree)")
+    arg_parser.add_argument("--passes", default="",
+                            help="comma separated optimization passes of the code generator")
+    arg_parser.add_argument("-O", dest="optimize", action="store_true",
+                            help="run all optimization passes and peephole rules "
+                                 "of the code generator")
+    arg_parser.add_argument("--output", metavar="PATH",
+                            help="write the JSON results to PATH (default: stdout)")
+    arg_parser.add_argument("--baseline", metavar="PATH",
+                            help="compare the rates with the JSON results in PATH and exit "
+                                 "with 1 when one of them regressed")
+    arg_parser.add_argument("--tolerance", type=float, default=0.1,
+                            help="fraction a rate may drop below the baseline (default: 0.1)")
+    args = arg_parser.parse_args()
+
+    generator = ProgramGenerator(args.statements, args.depth, args.expression_length,
+                                 args.identifiers, args.seed)
+    source = args.source.read() if args.source is not None else generator.generate()
+    if args.print_program:
+        sys.stdout.write(source)
+        return
+
+    passes = codegen.PassManager.DEFAULT if args.optimize else \
+        [name for name in args.passes.split(",") if len(name) > 0]
+    peephole = codegen.Peephole.RULES if args.optimize else []
+
+    benchmark = Benchmark(source, args.repeat, args.lexer, args.parser, args.semantic,
+                          passes, peephole)
+    try:
+        report = benchmark.run()
+    except (syntax.ParserException, semantic.SemanticException) as e:
+        sys.stderr.write("{}\n".format(e))
+        exit(1)
+    report["program"] = {"file": args.source.name} if args.source is not None else {
+        "statements": generator.statements, "depth": generator.depth,
+        "expression_length": generator.expression_length,
+        "identifiers": len(generator.names), "seed": generator.seed}
+    report["revision"] = revision()
+    report["python"] = platform.python_version()
+
+    regressions = []
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            ratios, regressions = compare(report, json.load(f), args.tolerance)
+        report["baseline"] = {"file": args.baseline, "ratios": ratios,
+                              "regressions": regressions}
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write("\n")
+
+    if len(regressions) > 0:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+import argparse
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+
+
+def import_phase(directory, module):
+    """ Import the analyzer of a lab directory next to this script """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    return importlib.import_module(module)
+
+
+lexical = import_phase("1-Lexical-Analysis", "LeksickiAnalizator")
+syntax = import_phase("2-Syntax-Analysis", "SintaksniAnalizator")
+semantic = import_phase("3-Semantic-Analysis", "SemantickiAnalizator")
+codegen = import_phase("4-Code-Generator", "FRISCGenerator")
+
+
+class Compilation:
+    """
+    Results of the phases for one source.
+
+    Phases that did not run are None, error is the error line of the
+    phase that failed (as its script prints it) or None and failed is
+    the stage of that phase. The error line is written once, after the
+    dumped stages, when one of them is the failed stage or comes after
+    it, as the chained scripts of the phases print it.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.tokens = None
+        self.ast = None
+        self.semantic_tokens = None
+        self.frisc = None
+        self.value = None
+        self.error = None
+        self.failed = None
+
+    def write(self, stream, stages):
+        """ Dumped stages in the given order, then the error line """
+        for stage in stages:
+            STAGES[stage](self, stream)
+        names = list(STAGES)
+        if self.error is not None and \
+                max(names.index(stage) for stage in stages) >= names.index(self.failed):
+            stream.write(self.error + "\n")
+
+    def write_tokens(self, stream):
+        """ Tokens as printed by LeksickiAnalizator """
+        lines = ["{}\n".format(token) for token in self.tokens]
+        stream.write("".join(lines))
+
+    def write_ast(self, stream):
+        """ AST as printed by SintaksniAnalizator """
+        if self.ast is not None:
+            self.ast.write(stream)
+
+    def write_semantic(self, stream):
+        """ Semantic tokens as printed by SemantickiAnalizator """
+        if self.semantic_tokens is not None:
+            lines = ["{}\n".format(token) for token in self.semantic_tokens]
+            stream.write("".join(lines))
+
+    def write_frisc(self, stream):
+        """ FRISC program as FRISCGenerator writes it to a.frisc """
+        if self.frisc is not None:
+            self.frisc.write(stream)
+
+    def write_value(self, stream):
+        """ Value of rez as FRISCSimulator prints R6 """
+        if self.value is not None:
+            stream.write("{}\n".format(self.value))
+
+
+class Compiler:
+    """
+    Compiler for language 'PJ' running all phases in one process.
+
+    Phases pass their in-memory results on: tokens of the compact lexer
+    go straight to the table-driven parser, the parser's AST to the
+    semantic analysis and, when generate is set, the code generator
+    with the given optimization passes. When evaluate is set, the value
+    of rez is computed by the Python backend. All phases share one symbol
+    table, so every identifier is interned once. Text formats of the
+    phases are only produced when asked for (see <class Compilation>).
+    """
+
+    def __init__(self, debug_flag=False, stats=None, generate=False, passes=(),
+                 evaluate=False, peephole=()):
+        self.debug_flag = debug_flag
+        self.stats = stats
+        self.generate = generate
+        self.evaluate = evaluate
+        self.passes = list(passes)
+        self.peephole = list(peephole)
+
+    def phase(self, name):
+        return self.stats.phase(name) if self.stats is not None else nullcontext()
+
+    def compile(self, source):
+        """ Run the phases on source text and return <class Compilation> """
+        result = Compilation(source)
+        symbols = lexical.SymbolTable()
+
+        with self.phase("lexer"):
+            lexer = lexical.CompactLexer(source, self.debug_flag, symbols, self.stats)
+            lexer.analyze()
+            result.tokens = lexer.tokens
+
+        with self.phase("parser"):
+            parser = syntax.StackParser(result.tokens, self.debug_flag, symbols, self.stats)
+            try:
+                parser.parse()
+            except syntax.ParserException as e:
+                result.error = str(e)
+                result.failed = "ast"
+                return result
+            result.ast = parser.ast_root
+
+        with self.phase("semantic"):
+            analyzer = semantic.TreeSemantic(result.ast, self.debug_flag, symbols, self.stats)
+            try:
+                analyzer.analyse()
+            except semantic.SemanticException as e:
+                result.error = str(e)
+                result.failed = "semantic"
+            result.semantic_tokens = analyzer.get_tokens()
+
+        if (self.generate or self.evaluate) and result.error is None:
+            generator = codegen.FRISCGenerator(result.ast, self.passes, self.debug_flag,
+                                               self.stats, self.peephole)
+            if self.generate:
+                with self.phase("codegen"):
+                    generator.generate()
+                    result.frisc = generator
+            if self.evaluate:
+                with self.phase("python"):
+                    result.value = generator.evaluate()
+
+        return result
+
+
+STAGES = {
+    "tokens": Compilation.write_tokens,
+    "ast": Compilation.write_ast,
+    "semantic": Compilation.write_semantic,
+    "frisc": Compilation.write_frisc,
+    "rez": Compilation.write_value
+}
+
+
+class Batch:
+    """
+    Compilation of many independent sources on a process pool.
+
+    Sources are given as files or directories (searched for *.pj files),
+    every worker process compiles whole files and writes the dumped stages
+    of each file to its own output file, mirroring the source tree below
+    output_dir. Results come back in the sorted order of the sources,
+    whatever the pool finished first.
+    """
+
+    SOURCE_SUFFIX = ".pj"
+    OUTPUT_SUFFIX = ".out"
+
+    def __init__(self, paths, output_dir, stages=("semantic",), jobs=None, passes=(),
+                 peephole=()):
+        self.sources = self.find_sources(paths)
+        self.output_dir = output_dir
+        self.stages = list(stages)
+        self.jobs = jobs if jobs is not None else os.cpu_count() or 1
+        self.passes = list(passes)
+        self.peephole = list(peephole)
+
+    @staticmethod
+    def find_sources(paths):
+        sources = list()
+        for path in paths:
+            if os.path.isdir(path):
+                for directory, _, files in os.walk(path):
+                    sources += [os.path.join(directory, name) for name in files
+                                if name.endswith(Batch.SOURCE_SUFFIX)]
+            else:
+                sources.append(path)
+        return sorted(set(sources))
+
+    def output_path(self, source, root):
+        name = os.path.relpath(os.path.abspath(source), root)
+        if name.endswith(self.SOURCE_SUFFIX):
+            name = name[:-len(self.SOURCE_SUFFIX)]
+        return os.path.join(self.output_dir, name + self.OUTPUT_SUFFIX)
+
+    def run(self):
+        """ Compile all sources and return the summary """
+        start = time.perf_counter()
+        summary = {"jobs": self.jobs, "files": [], "ok": 0, "err": 0, "failed": 0}
+
+        if len(self.sources) > 0:
+            root = os.path.commonpath([os.path.dirname(os.path.abspath(source))
+                                       for source in self.sources])
+            tasks = [(source, self.output_path(source, root), self.stages,
+                      self.passes, self.peephole) for source in self.sources]
+
+            with ProcessPoolExecutor(self.jobs) if self.jobs > 1 else nullcontext() as pool:
+                if pool is None:
+                    results = map(compile_file, tasks)
+                else:
+                    chunk_size = max(1, len(tasks) // (self.jobs * 8))
+                    results = pool.map(compile_file, tasks, chunksize=chunk_size)
+
+                for result in results:
+                    summary["files"].append(result)
+                    summary[result["status"]] += 1
+
+        summary["total"] = len(summary["files"])
+        summary["seconds"] = time.perf_counter() - start
+        return summary
+
+
+def compile_file(task):
+    """ Compile one source of a batch in a worker and write its output """
+    source, output, stages, passes, peephole = task
+    start = time.perf_counter()
+    result = {"source": source, "output": output}
+    try:
+        with open(source) as f:
+            compiler = Compiler(generate="frisc" in stages, passes=passes,
+                                evaluate="rez" in stages, peephole=peephole)
+            compilation = compiler.compile(f.read())
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w") as f:
+            compilation.write(f, stages)
+        result["status"] = "ok" if compilation.error is None else "err"
+        result["error"] = compilation.error
+    except Exception as e:
+        result["status"] = "failed"
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Compiler for language 'PJ'")
+    arg_parser.add_argument("source", nargs="?", type=argparse.FileType("r"), default=sys.stdin,
+                            help="source file (default: stdin)")
+    arg_parser.add_argument("--dump", choices=STAGES.keys(), action="append", default=[],
+                            help="print the output of a phase in its text format, repeatable "
+                                 "(default: semantic)")
+    arg_parser.add_argument("--stats", action="store_true",
+                            help="write phase timings and counters as JSON to stderr")
+    arg_parser.add_argument("--batch", metavar="PATH", nargs="+",
+                            help="compile source files and directories of *.pj files "
+                                 "on a process pool instead of one source")
+    arg_parser.add_argument("--output", metavar="DIR", default="build",
+                            help="directory for the outputs of --batch (default: build)")
+    arg_parser.add_argument("--jobs", type=int, default=None,
+                            help="worker processes for --batch (default: number of CPUs)")
+    arg_parser.add_argument("--passes", default="",
+                            help="comma separated optimization passes of the code generator")
+    arg_parser.add_argument("--peephole", nargs="?", const=",".join(codegen.Peephole.RULES),
+                            default="",
+                            help="comma separated peephole rules of the code generator "
+                                 "(all when given without rules)")
+    arg_parser.add_argument("-O", dest="optimize", action="store_true",
+                            help="run all optimization passes and peephole rules "
+                                 "of the code generator")
+    args = arg_parser.parse_args()
+
+    if args.jobs is not None and args.jobs < 1:
+        arg_parser.error("--jobs needs at least one worker process")
+
+    stages = args.dump or ["semantic"]
+    passes = codegen.PassManager.DEFAULT if args.optimize else \
+        [name for name in args.passes.split(",") if len(name) > 0]
+    peephole = codegen.Peephole.RULES if args.optimize else \
+        [rule for rule in args.peephole.split(",") if len(rule) > 0]
+
+    if args.batch is not None:
+        batch = Batch(args.batch, args.output, stages, args.jobs, passes, peephole)
+        summary = batch.run()
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+        if summary["ok"] != summary["total"]:
+            exit(1)
+        return
+
+    stats = lexical.Stats() if args.stats else None
+
+    with stats.phase("read") if stats else nullcontext():
+        source = args.source.read()
+
+    compiler = Compiler(stats=stats, generate="frisc" in stages, passes=passes,
+                        evaluate="rez" in stages, peephole=peephole)
+    result = compiler.compile(source)
+
+    with stats.phase("output") if stats else nullcontext():
+        result.write(sys.stdout, stages)
+
+    if stats is not None:
+        stats.dump()
+
+    if result.error is not None:
+        exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import unittest
+
+from Benchmark import Benchmark, ProgramGenerator, compare
+from Prevoditelj import Compiler
+
+
+class ProgramGeneratorTest(unittest.TestCase):
+
+    def test_same_arguments_same_program(self):
+        program = ProgramGenerator(200, 3, 4, 10, seed=7).generate()
+        self.assertEqual(ProgramGenerator(200, 3, 4, 10, seed=7).generate(), program)
+        self.assertNotEqual(ProgramGenerator(200, 3, 4, 10, seed=8).generate(), program)
+
+        generator = ProgramGenerator(200, 3, 4, 10, seed=7)
+        self.assertEqual(generator.generate(), generator.generate())
+
+    def test_programs_compile(self):
+        for seed in range(5):
+            source = ProgramGenerator(100, 3, 3, 5, seed).generate()
+            result = Compiler().compile(source)
+            self.assertIsNone(result.error, source)
+            self.assertTrue(source.splitlines()[-1].startswith("rez = "))
+
+
+class CompareTest(unittest.TestCase):
+
+    @staticmethod
+    def report(lexer, parser, semantic=None):
+        phases = {"lexer": {"tokens_per_second": lexer},
+                  "parser": {"nodes_per_second": parser}}
+        if semantic is not None:
+            phases["semantic"] = {"lookups_per_second": semantic}
+        return {"phases": phases}
+
+    def test_regression_below_tolerance(self):
+        ratios, regressions = compare(self.report(85.0, 95.0, 50.0),
+                                      self.report(100.0, 100.0), 0.1)
+        self.assertEqual(ratios, {"lexer.tokens_per_second": 0.85,
+                                  "parser.nodes_per_second": 0.95})
+        self.assertEqual(regressions, ["lexer.tokens_per_second"])
+
+    def test_no_regression(self):
+        _, regressions = compare(self.report(120.0, 90.0), self.report(100.0, 100.0), 0.1)
+        self.assertEqual(regressions, [])
+        _, regressions = compare(self.report(1.0, 1.0), {}, 0.1)
+        self.assertEqual(regressions, [])
+
+    def test_report_against_itself(self):
+        report = Benchmark(ProgramGenerator(50, 2, 3, 5).generate(), repeat=1).run()
+        ratios, regressions = compare(report, report, 0.0)
+        self.assertEqual(set(ratios.values()), {1.0})
+        self.assertEqual(len(ratios), 4)
+        self.assertEqual(regressions, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import io
+import os
+import tempfile
+import unittest
+
+from Prevoditelj import Batch, Compiler
+
+
+class CompilationTest(unittest.TestCase):
+
+    def dump(self, source, stages):
+        compiler = Compiler(generate="frisc" in stages, evaluate="rez" in stages)
+        stream = io.StringIO()
+        compiler.compile(source).write(stream, stages)
+        return stream.getvalue()
+
+    def test_error_once_after_the_stages(self):
+        source = "a = 1\nza i od 1 do a\n b = i\naz\nrez = b\n"
+        self.assertEqual(self.dump(source, ["semantic", "rez"]), "2 1 a\n3 2 i\nerr 5 b\n")
+        self.assertEqual(self.dump(source, ["semantic", "frisc", "rez"]),
+                         "2 1 a\n3 2 i\nerr 5 b\n")
+        self.assertEqual(self.dump("a = 1 +\n", ["tokens", "ast", "semantic"]),
+                         "IDN 1 a\nOP_PRIDRUZI 1 =\nBROJ 1 1\nOP_PLUS 1 +\nerr kraj\n")
+
+    def test_no_error_before_the_failed_stage(self):
+        # the syntax analyzer does not know about semantic errors
+        dump = self.dump("rez = b\n", ["ast"])
+        self.assertTrue(dump.startswith("<program>\n"))
+        self.assertNotIn("err", dump)
+        self.assertEqual(self.dump("a = 1 +\n", ["tokens"]),
+                         "IDN 1 a\nOP_PRIDRUZI 1 =\nBROJ 1 1\nOP_PLUS 1 +\n")
+        self.assertEqual(self.dump("rez = 2 * 3\n", ["semantic", "rez"]), "6\n")
+
+
+class BatchTest(unittest.TestCase):
+
+    SOURCES = {
+        "ok.pj": "a = 2\nza i od 1 do a\n rez = i * a\naz\n",
+        os.path.join("petlje", "err.pj"): "a = 1\nza i od 1 do a\n b = i\naz\nrez = b\n"
+    }
+
+    def run_batch(self, jobs):
+        with tempfile.TemporaryDirectory() as directory:
+            sources = os.path.join(directory, "src")
+            for name, text in self.SOURCES.items():
+                path = os.path.join(sources, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, "w") as f:
+                    f.write(text)
+
+            output = os.path.join(directory, "build")
+            summary = Batch([sources], output, jobs=jobs).run()
+            outputs = dict()
+            for name in self.SOURCES:
+                with open(os.path.join(output, name[:-len(".pj")] + ".out")) as f:
+                    outputs[name] = f.read()
+        return summary, outputs
+
+    def check(self, jobs):
+        summary, outputs = self.run_batch(jobs)
+        self.assertEqual((summary["jobs"], summary["total"], summary["ok"], summary["err"],
+                          summary["failed"]), (jobs, 2, 1, 1, 0))
+        self.assertEqual([(os.path.basename(result["source"]), result["status"], result["error"])
+                          for result in summary["files"]],
+                         [("ok.pj", "ok", None), ("err.pj", "err", "err 5 b")])
+        self.assertEqual(outputs, {
+            "ok.pj": "2 1 a\n3 2 i\n3 1 a\n",
+            os.path.join("petlje", "err.pj"): "2 1 a\n3 2 i\nerr 5 b\n"
+        })
+
+    def test_in_process(self):
+        self.check(1)
+
+    def test_process_pool(self):
+        self.check(2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,34 @@
+#!/bin/bash
+
+# Prevoditelj.py against the scripts of the phases: the examples of every
+# lab (without arguments of their own) dumped at the stage of the lab
+
+passed=0
+total=0
+
+for lab in "1-Lexical-Analysis tokens test.in test" "2-Syntax-Analysis ast test.pj test" \
+           "3-Semantic-Analysis semantic Test.pj Test" "4-Code-Generator rez Test.pj Test";
+do
+    set -- $lab
+
+    for t in $1/tests/*;
+    do
+        if [[ ! -f $t/$3 || -f $t/$4.args ]];
+        then
+            continue
+        fi
+
+        python3.8 Prevoditelj.py --dump $2 < $t/$3 > /tmp/test.out
+        diff -s $t/$4.out /tmp/test.out
+
+        if [[ $(diff -s $t/$4.out /tmp/test.out) == *"identical"* ]];
+        then
+            passed=$(($passed + 1))
+        fi
+        total=$(($total + 1))
+    done
+done
+
+echo -e "\nPassed: $passed \nTotal : $total"
+
+python3.8 -m unittest -q TestPrevoditelj TestBenchmark